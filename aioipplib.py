@@ -0,0 +1,1018 @@
+import asyncio
+import base64
+import getpass
+import itertools
+import os
+import zlib
+from tempfile import NamedTemporaryFile
+
+from ipplib import (IPP_CAPABILITY_ATTRIBUTES, IPP_DEFAULT_CLASS_ATTRIBUTES, IPP_DEFAULT_JOB_ATTRIBUTES,
+                    IPP_DEFAULT_JOB_EVENTS, IPP_DEFAULT_PRINTER_ATTRIBUTES, IPP_DEFAULT_PRINTER_EVENTS,
+                    IPP_EXPECT_CONTINUE_TIMEOUT, IPP_SUBSCRIPTION_LEASE_DURATION, IPP_TEST_PAGE, IPP_UPLOAD_BLOCK_SIZE,
+                    IppException, IppOperation, IppStatus, IppTransportException, construct_request,
+                    create_ssl_context, parse_response_without_check, _IPP_COMPRESSION_WBITS,
+                    _IPP_IDEMPOTENT_OPERATIONS, _IPP_REQUEST_ERRORS, _STRUCT_SHORT, _IppEventCursor,
+                    _assign_request_id, _check_request_id, _check_response_for_errors, _construct_subscription,
+                    _iter_document_blocks, _unix_socket_path)
+
+
+class _AsyncConnection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    def is_healthy(self):
+        # an idle keep-alive connection which received eof was closed by the server
+        return not self.reader.at_eof() and not self.writer.transport.is_closing()
+
+    def close(self):
+        self.writer.close()
+
+
+def _write_chunk(writer: asyncio.StreamWriter, block: bytes):
+    # an empty chunk would end the body
+    if block:
+        writer.write('{0:x}\r\n'.format(len(block)).encode('ascii'))
+        writer.write(block)
+        writer.write(b'\r\n')
+
+
+async def _write_chunked(writer: asyncio.StreamWriter, data: bytes, document, compression=None):
+    _write_chunk(writer, data)
+
+    compressor = None
+    if compression:
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, _IPP_COMPRESSION_WBITS[compression])
+
+    async def write_block(block):
+        _write_chunk(writer, compressor.compress(block) if compressor else block)
+        await writer.drain()
+
+    if hasattr(document, '__aiter__'):
+        async for block in document:
+            await write_block(block)
+    elif hasattr(document, 'read'):
+        loop = asyncio.get_event_loop()
+
+        while True:
+            block = await loop.run_in_executor(None, document.read, IPP_UPLOAD_BLOCK_SIZE)
+            if not block:
+                break
+
+            await write_block(block)
+    else:
+        for block in _iter_document_blocks(document):
+            await write_block(block)
+
+    if compressor:
+        _write_chunk(writer, compressor.flush())
+
+    writer.write(b'0\r\n\r\n')
+    await writer.drain()
+
+
+async def _wait_for_continue(reader: asyncio.StreamReader):
+    """
+    waits for the interim 100 response, returns the status line of the final response if the server rejected the
+    request - without any response within the timeout the body is sent anyway (rfc 7231 5.1.1)
+    """
+
+    try:
+        status_line = await asyncio.wait_for(reader.readline(), IPP_EXPECT_CONTINUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        return None
+
+    if not status_line:
+        raise ConnectionResetError('Connection closed by IPP Server')
+
+    if status_line.split(None, 2)[1:2] != [b'100']:
+        return status_line
+
+    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+        pass
+
+    return None
+
+
+async def _read_http_response(reader: asyncio.StreamReader, status_line=None):
+    """
+    reads one http/1.1 response and returns (status, body, keep alive) - interim 1xx responses are skipped
+    """
+
+    while True:
+        if status_line is None:
+            status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Connection closed by IPP Server')
+
+        parts = status_line.split(None, 2)
+        if len(parts) < 2:
+            raise IppTransportException('Invalid HTTP status line: {0!r}'.format(status_line))
+
+        status = int(parts[1])
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if status >= 200:
+            break
+
+        status_line = None
+
+    keep_alive = headers.get('connection', '').lower() != 'close'
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        body = bytearray()
+
+        while True:
+            size = int((await reader.readline()).split(b';', 1)[0].strip(), 16)
+            if not size:
+                break
+
+            body += await reader.readexactly(size)
+            await reader.readline()
+
+        # skip trailers
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+
+        body = bytes(body)
+    elif 'content-length' in headers:
+        body = await reader.readexactly(int(headers['content-length']))
+    else:
+        body = await reader.read()
+        keep_alive = False
+
+    return status, body, keep_alive
+
+
+class AsyncIppEventStream:
+    """
+    asyncio variant of IppEventStream
+    """
+
+    def __init__(self, client, subscription_ids, sequence_numbers=None, lease_duration=IPP_SUBSCRIPTION_LEASE_DURATION,
+                 wait=True, poll_interval=None):
+        self._client = client
+        self._cursor = _IppEventCursor(subscription_ids, sequence_numbers, lease_duration, wait, poll_interval)
+        self._events = []
+        self._closed = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        cursor = self._cursor
+
+        if self._closed is None:
+            self._closed = asyncio.Event()
+
+        while not self._events:
+            if self._closed.is_set():
+                raise StopAsyncIteration
+
+            for subscription_id in cursor.due_renewals():
+                try:
+                    await self._client.renew_subscription(subscription_id, cursor.lease_duration)
+                except IppException as e:
+                    if e.code != IppStatus.ERROR_NOT_POSSIBLE:
+                        raise
+
+                    cursor.renewed(subscription_id, False)
+                else:
+                    cursor.renewed(subscription_id)
+
+            response = await self._client._request(self._client._construct_uri('', ''),
+                                                   cursor.construct_request(self._client.user))
+            self._events = cursor.process(response)
+
+            if not self._events:
+                try:
+                    await asyncio.wait_for(self._closed.wait(), cursor.interval)
+                except asyncio.TimeoutError:
+                    pass
+
+        return self._events.pop(0)
+
+    @property
+    def sequence_numbers(self):
+        return dict(self._cursor.sequence_numbers)
+
+    async def close(self, cancel=False):
+        if self._closed is None:
+            self._closed = asyncio.Event()
+
+        self._closed.set()
+
+        if cancel:
+            for subscription_id in self._cursor.sequence_numbers:
+                await self._client.cancel_subscription(subscription_id)
+
+
+class AsyncIppClient:
+    """
+    asyncio variant of IppClient
+
+    connections are opened on first use and kept alive, at most pool_size requests run at the same time
+    """
+
+    def __init__(self, host, port=631, user=None, password=None, use_ssl=True, verify_certificate=True, pool_size=4,
+                 records=False, ssl_context=None):
+        self.__host = host
+        self.__port = port
+        self.__user = user if user else getpass.getuser()
+        self.__pool_size = pool_size
+        self.__socket_path = _unix_socket_path(host)
+        self.__authority = 'localhost' if self.__socket_path else '{0}:{1}'.format(host, port)
+
+        if use_ssl and not self.__socket_path:
+            self.__ssl_context = ssl_context or create_ssl_context(verify_certificate)
+        else:
+            self.__ssl_context = None
+
+        self.__headers = {
+            'Content-Type': 'application/ipp'
+        }
+
+        if user and password:
+            self.__headers['Authorization'] = "Basic {0}".format(
+                base64.b64encode('{0}:{1}'.format(user, password).encode('utf-8')).decode('utf-8'))
+
+        self._idle_connections = []
+        self._semaphore = None
+        self._printer_capabilities = {}
+        self._records = records
+        self._request_ids = itertools.count()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    @property
+    def host(self):
+        return self.__host
+
+    @property
+    def port(self):
+        return self.__port
+
+    @property
+    def user(self):
+        return self.__user
+
+    @user.setter
+    def user(self, user):
+        self.__user = user
+
+    async def close(self):
+        connections, self._idle_connections = self._idle_connections, []
+
+        for connection in connections:
+            connection.close()
+
+    async def _open_connection(self):
+        try:
+            if self.__socket_path:
+                reader, writer = await asyncio.open_unix_connection(self.__socket_path)
+            else:
+                reader, writer = await asyncio.open_connection(self.__host, self.__port, ssl=self.__ssl_context)
+        except OSError as e:
+            raise IppTransportException('Could not connect to IPP Server: {0}'.format(e))
+
+        return _AsyncConnection(reader, writer)
+
+    async def _acquire(self):
+        while self._idle_connections:
+            connection = self._idle_connections.pop()
+
+            if connection.is_healthy():
+                return connection
+
+            connection.close()
+
+        return await self._open_connection()
+
+    def _release(self, connection, reusable=True):
+        if reusable:
+            self._idle_connections.append(connection)
+        else:
+            connection.close()
+
+    def _construct_uri(self, namespace: str, ipp_object: str):
+        return "http://{0}/{1}/{2}".format(self.__authority, namespace, ipp_object)
+
+    def _construct_request_head(self, uri: str, content_length=None, expect_continue=False):
+        head = ['POST {0} HTTP/1.1'.format(uri), 'Host: {0}'.format(self.__authority)]
+
+        if content_length is None:
+            head.append('Transfer-Encoding: chunked')
+        else:
+            head.append('Content-Length: {0}'.format(content_length))
+
+        if expect_continue:
+            head.append('Expect: 100-continue')
+
+        head.extend('{0}: {1}'.format(name, value) for name, value in self.__headers.items())
+
+        return ('\r\n'.join(head) + '\r\n\r\n').encode('latin-1')
+
+    async def _exchange(self, connection, uri: str, data: bytes, document=None, document_size=0, compression=None):
+        writer = connection.writer
+        reader = connection.reader
+
+        # documents of unknown size are sent with chunked transfer encoding
+        content_length = None if document_size is None else len(data) + document_size
+
+        # uploads wait for the interim 100 response, so rejected requests never send the document
+        expect_continue = document is not None
+
+        writer.write(self._construct_request_head(uri, content_length, expect_continue))
+
+        if expect_continue:
+            await writer.drain()
+
+            status_line = await _wait_for_continue(reader)
+            if status_line:
+                # the announced body was never sent, the connection can't be reused
+                status, body, _ = await _read_http_response(reader, status_line)
+                return status, body, False
+
+        if document_size is None:
+            await _write_chunked(writer, data, document, compression)
+
+            return await _read_http_response(reader)
+
+        writer.write(data)
+
+        if document is not None and document_size:
+            loop = asyncio.get_event_loop()
+
+            await writer.drain()
+
+            # loop.sendfile uses os.sendfile on plaintext transports and falls back to reading blocks
+            if hasattr(loop, 'sendfile'):
+                await loop.sendfile(writer.transport, document, 0, document_size)
+            else:
+                while True:
+                    block = await loop.run_in_executor(None, document.read, IPP_UPLOAD_BLOCK_SIZE)
+                    if not block:
+                        break
+
+                    writer.write(block)
+                    await writer.drain()
+
+        await writer.drain()
+
+        return await _read_http_response(reader)
+
+    async def _request(self, uri: str, data: bytes, contains_data=False, document=None, document_size=0,
+                       compression=None, assign_request_id=True):
+        if assign_request_id:
+            data = _assign_request_id(data, self._request_ids)
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.__pool_size)
+
+        # idempotent operations are repeated once on a new connection if a kept-alive connection went stale
+        retries = 1 if _STRUCT_SHORT.unpack_from(data, 2)[0] in _IPP_IDEMPOTENT_OPERATIONS else 0
+
+        async with self._semaphore:
+            while True:
+                connection = await self._acquire()
+
+                try:
+                    status, body, keep_alive = await self._exchange(connection, uri, data, document, document_size,
+                                                                    compression)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    self._release(connection, False)
+
+                    if not retries:
+                        raise
+
+                    retries -= 1
+                    continue
+                except BaseException:
+                    self._release(connection, False)
+                    raise
+
+                # the response is checked before the connection is reused
+                if status == 200:
+                    try:
+                        response = parse_response_without_check(body, contains_data, self._records)
+                        _check_request_id(data, response['request-id'])
+                    except BaseException:
+                        self._release(connection, False)
+                        raise
+
+                self._release(connection, keep_alive)
+                break
+
+        if status != 200:
+            raise IppTransportException('Error: {0}'.format(status))
+
+        _check_response_for_errors(response)
+
+        return response
+
+    async def send_request(self, uri: str, operation: IppOperation, request_id: int, operation_attributes=None,
+                           job_attributes=None, printer_attributes=None):
+
+        data = construct_request(operation, request_id, operation_attributes, job_attributes, printer_attributes)
+
+        return await self._request("http://{0}/{1}".format(self.__authority, uri), data, assign_request_id=False)
+
+    async def send_raw_request(self, uri: str, raw_request: bytes):
+        return await self._request("http://{0}/{1}".format(self.__authority, uri), raw_request,
+                                   assign_request_id=False)
+
+    async def _create_job(self, printer: str, job_name: str, copies=1, priority=50):
+        data = construct_request(IppOperation.CREATE_JOB, 1, operation_attributes={
+            'printer-uri': 'ipp://localhost/printers/{0}'.format(printer),
+            'requesting-user-name': self.__user,
+            'job-name': job_name
+        }, job_attributes={
+            'copies': copies,
+            'job-priority': priority
+        })
+
+        response_data = await self._request(self._construct_uri('printers', printer), data)
+
+        return response_data['jobs'][0]['job-id']
+
+    def _construct_send_document(self, printer: str, job_id: int, document_name: str, document_format: str,
+                                 compression=None):
+        operation_attributes = {
+            'printer-uri': 'ipp://localhost/printers/{0}'.format(printer),
+            'requesting-user-name': self.__user,
+            'job-id': job_id,
+            'document-name': document_name,
+            'document-format': document_format,
+            'last-document': True
+        }
+
+        if compression:
+            operation_attributes['compression'] = compression
+
+        return construct_request(IppOperation.SEND_DOCUMENT, 2, operation_attributes=operation_attributes)
+
+    def _construct_print_job(self, printer: str, job_name: str, document_format: str, copies=1, priority=50,
+                             compression=None):
+        operation_attributes = {
+            'printer-uri': 'ipp://localhost/printers/{0}'.format(printer),
+            'requesting-user-name': self.__user,
+            'job-name': job_name,
+            'document-format': document_format
+        }
+
+        if compression:
+            operation_attributes['compression'] = compression
+
+        return construct_request(IppOperation.PRINT_JOB, 1, operation_attributes=operation_attributes,
+                                 job_attributes={
+                                     'copies': copies,
+                                     'job-priority': priority
+                                 })
+
+    async def _get_printer_capabilities(self, printer: str):
+        # the supported values of a printer are fetched once per client
+        # without them the job is sent without print-job and compression, as before the lookup existed
+        capabilities = self._printer_capabilities.get(printer)
+
+        if capabilities is None:
+            try:
+                capabilities = await self.get_printer_attributes(printer, IPP_CAPABILITY_ATTRIBUTES)
+            except _IPP_REQUEST_ERRORS + (asyncio.IncompleteReadError,):
+                return {}
+
+            self._printer_capabilities[printer] = capabilities
+
+        return capabilities
+
+    async def _use_print_job(self, printer: str, use_print_job=None):
+        # single document jobs are sent with one print-job request if the printer supports it,
+        # create-job + send-document needs two round trips
+        if use_print_job is not None:
+            return use_print_job
+
+        supported = (await self._get_printer_capabilities(printer)).get('operations-supported', [])
+        if not isinstance(supported, list):
+            supported = [supported]
+
+        return IppOperation.PRINT_JOB in supported
+
+    async def _negotiate_compression(self, printer: str, compression):
+        # falls back to an uncompressed upload if the printer doesn't support the requested compression
+        if not compression or compression == 'none':
+            return None
+
+        supported = (await self._get_printer_capabilities(printer)).get('compression-supported', [])
+        if not isinstance(supported, list):
+            supported = [supported]
+
+        return compression if compression in supported else None
+
+    async def print_file(self, printer: str, file_path: str, job_name=None, copies=1, priority=50,
+                         compression=None, use_print_job=None):
+        """
+        compression: 'gzip' or 'deflate' compresses the document while it is sent, if the printer supports it
+        use_print_job: submit the job with a single print-job request instead of create-job + send-document,
+        by default it is used if the printer supports it
+        """
+
+        if not os.path.exists(file_path):
+            return None
+
+        if not job_name:
+            job_name = os.path.basename(file_path)
+
+        compression = await self._negotiate_compression(printer, compression)
+
+        if await self._use_print_job(printer, use_print_job):
+            job_id = None
+
+            data = self._construct_print_job(printer, job_name, 'application/octet-stream', copies, priority,
+                                             compression)
+        else:
+            # construct request body part 1
+            # create job
+            job_id = await self._create_job(printer, job_name, copies, priority)
+
+            # construct request body part 2
+            # create document
+            data = self._construct_send_document(printer, job_id, job_name, 'application/octet-stream', compression)
+
+        try:
+            # the size of a compressed document isn't known before it is sent
+            with open(file_path, 'rb') as doc_obj:
+                response_data = await self._request(self._construct_uri('printers', printer), data, document=doc_obj,
+                                                    document_size=None if compression else os.path.getsize(file_path),
+                                                    compression=compression)
+        except BaseException:
+            if job_id is not None:
+                await self._cancel_created_job(job_id)
+            raise
+
+        return job_id if job_id is not None else response_data['jobs'][0]['job-id']
+
+    async def print_stream(self, printer: str, document, job_name='Untitled', copies=1, priority=50,
+                           document_format='application/octet-stream', compression=None, use_print_job=None):
+        """
+        prints bytes, a file-like object, an iterable or an async iterable of byte blocks
+
+        the size doesn't have to be known, the document is sent with chunked transfer encoding while it is produced
+        """
+
+        compression = await self._negotiate_compression(printer, compression)
+
+        if await self._use_print_job(printer, use_print_job):
+            job_id = None
+
+            data = self._construct_print_job(printer, job_name, document_format, copies, priority, compression)
+        else:
+            job_id = await self._create_job(printer, job_name, copies, priority)
+
+            data = self._construct_send_document(printer, job_id, job_name, document_format, compression)
+
+        try:
+            response_data = await self._request(self._construct_uri('printers', printer), data, document=document,
+                                                document_size=None, compression=compression)
+        except BaseException:
+            if job_id is not None:
+                await self._cancel_created_job(job_id)
+            raise
+
+        return job_id if job_id is not None else response_data['jobs'][0]['job-id']
+
+    async def _cancel_created_job(self, job_id: int):
+        # see IppClient._cancel_created_job
+        try:
+            await self.cancel_job(job_id)
+        except _IPP_REQUEST_ERRORS + (asyncio.IncompleteReadError,):
+            pass
+
+    async def get_printer_attributes(self, printer: str, attributes=None):
+        printer_uri = 'ipp://localhost/printers/{0}'.format(printer)
+
+        data = construct_request(IppOperation.GET_PRINTER_ATTRIBUTES, 1, {
+            'printer-uri': printer_uri,
+            'requesting-user-name': self.__user,
+            'requested-attributes': attributes if attributes else IPP_DEFAULT_PRINTER_ATTRIBUTES
+        })
+
+        response_data = await self._request(self._construct_uri('printers', printer), data)
+
+        return response_data['printers'][0]
+
+    async def resume_printer(self, printer: str):
+        data = construct_request(IppOperation.RESUME_PRINTER, 1, {
+            'printer-uri': 'ipp://localhost/printers/{0}'.format(printer)
+        })
+
+        await self._request(self._construct_uri('admin', ''), data)
+
+        return True
+
+    async def pause_printer(self, printer: str):
+        data = construct_request(IppOperation.PAUSE_PRINTER, 1, {
+            'printer-uri': 'ipp://localhost/printers/{0}'.format(printer)
+        })
+
+        await self._request(self._construct_uri('admin', ''), data)
+
+        return True
+
+    async def get_jobs(self, printer=None, which_jobs='not-completed', my_jobs=False, attributes=None):
+        data = construct_request(IppOperation.GET_JOBS, 1, {
+            'printer-uri': 'ipp://localhost/printers/{0}'.format(printer if printer else ''),
+            'which-jobs': which_jobs,
+            'my-jobs': my_jobs,
+            'requested-attributes': attributes + ['job-id'] if attributes else IPP_DEFAULT_JOB_ATTRIBUTES
+        })
+
+        response_data = await self._request(self._construct_uri('', ''), data)
+
+        return {j['job-id']: j for j in response_data['jobs']}
+
+    async def get_job_attributes(self, job_id: int, attributes=None):
+        data = construct_request(IppOperation.GET_JOB_ATTRIBUTES, 1, {
+            'job-uri': 'ipp://localhost/jobs/{0}'.format(job_id),
+            'requested-attributes': attributes if attributes else IPP_DEFAULT_JOB_ATTRIBUTES
+        })
+
+        response_data = await self._request(self._construct_uri('', ''), data)
+
+        return response_data['jobs'][0]
+
+    async def cancel_job(self, job_id: int):
+        data = construct_request(IppOperation.CANCEL_JOB, 1, {
+            'job-uri': 'ipp://localhost/jobs/{0}'.format(job_id),
+            'requesting-user-name': self.__user
+        })
+
+        await self._request(self._construct_uri('jobs', ''), data)
+
+        return True
+
+    async def cancel_all_jobs(self, printer: str):
+        data = construct_request(IppOperation.CANCEL_JOB, 1, {
+            'printer-uri': 'ipp://localhost/printers/{0}'.format(printer),
+            'purge-jobs': True
+        })
+
+        await self._request(self._construct_uri('admin', ''), data)
+
+        return True
+
+    async def restart_job(self, job_id: int):
+        data = construct_request(IppOperation.RESTART_JOB, 1, {
+            'job-uri': 'ipp://localhost/jobs/{0}'.format(job_id),
+            'requesting-user-name': self.__user
+        })
+
+        await self._request(self._construct_uri('jobs', ''), data)
+
+        return True
+
+    async def set_job_hold_until(self, job_id: int, hold_until: str):
+        # hold_until: indefinite, no-hold
+
+        data = construct_request(IppOperation.RESTART_JOB, 1, {
+            'job-uri': 'ipp://localhost/jobs/{0}'.format(job_id),
+            'requesting-user-name': self.__user
+        }, job_attributes={
+            'job-hold-until': hold_until
+        })
+
+        await self._request(self._construct_uri('jobs', ''), data)
+
+        return True
+
+    async def create_printer_subscription(self, printer=None, events=None,
+                                          lease_duration=IPP_SUBSCRIPTION_LEASE_DURATION):
+        data = _construct_subscription(IppOperation.CREATE_PRINTER_SUBSCRIPTIONS, self.__user, printer,
+                                       events or IPP_DEFAULT_PRINTER_EVENTS, lease_duration)
+
+        response_data = await self._request(self._construct_uri('', ''), data)
+
+        return response_data['subscriptions'][0]['notify-subscription-id']
+
+    async def create_job_subscription(self, job_id: int, events=None):
+        data = _construct_subscription(IppOperation.CREATE_JOB_SUBSCRIPTIONS, self.__user,
+                                       events=events or IPP_DEFAULT_JOB_EVENTS, job_id=job_id)
+
+        response_data = await self._request(self._construct_uri('', ''), data)
+
+        return response_data['subscriptions'][0]['notify-subscription-id']
+
+    async def get_notifications(self, subscription_ids, sequence_numbers=None, wait=False):
+        cursor = _IppEventCursor(subscription_ids, sequence_numbers, wait=wait)
+
+        return cursor.process(await self._request(self._construct_uri('', ''), cursor.construct_request(self.__user)))
+
+    async def renew_subscription(self, subscription_id: int, lease_duration=IPP_SUBSCRIPTION_LEASE_DURATION):
+        data = construct_request(IppOperation.RENEW_SUBSCRIPTION, 1, {
+            'printer-uri': 'ipp://localhost/',
+            'notify-subscription-id': subscription_id,
+            'requesting-user-name': self.__user
+        }, subscription_attributes={
+            'notify-lease-duration': lease_duration
+        })
+
+        await self._request(self._construct_uri('', ''), data)
+
+        return True
+
+    async def cancel_subscription(self, subscription_id: int):
+        data = construct_request(IppOperation.CANCEL_SUBSCRIPTION, 1, {
+            'printer-uri': 'ipp://localhost/',
+            'notify-subscription-id': subscription_id,
+            'requesting-user-name': self.__user
+        })
+
+        await self._request(self._construct_uri('', ''), data)
+
+        return True
+
+    def stream_events(self, subscription_ids, sequence_numbers=None, lease_duration=IPP_SUBSCRIPTION_LEASE_DURATION,
+                      wait=True, poll_interval=None):
+        return AsyncIppEventStream(self, subscription_ids, sequence_numbers, lease_duration, wait, poll_interval)
+
+    async def print_test_page(self, printer, use_print_job=None):
+        if await self._use_print_job(printer, use_print_job):
+            data = self._construct_print_job(printer, 'Test Print', 'application/postscript')
+
+            response_data = await self._request(self._construct_uri('printers', printer), data + IPP_TEST_PAGE)
+
+            return response_data['jobs'][0]['job-id']
+
+        printer_uri = 'ipp://localhost/printers/{0}'.format(printer)
+
+        # construct request body part 1
+        # create job
+        data = construct_request(IppOperation.CREATE_JOB, 1, operation_attributes={
+            'printer-uri': printer_uri,
+            'requesting-user-name': self.__user,
+            'job-name': 'Test Print'
+        })
+
+        response_data = await self._request(self._construct_uri('printers', printer), data)
+
+        job_id = response_data['jobs'][0]['job-id']
+
+        # construct request body part 2
+        # create document
+        data = self._construct_send_document(printer, job_id, 'Test Print', 'application/postscript')
+
+        await self._request(self._construct_uri('printers', printer), data + IPP_TEST_PAGE)
+
+        return job_id
+
+    async def connect(self):
+        # opens a connection ahead of the first request
+        self._release(await self._acquire())
+
+    async def test_connection(self):
+        try:
+            await self.connect()
+
+            return True
+        except IppTransportException:
+            return False
+
+
+class AsyncCupsClient(AsyncIppClient):
+    async def get_devices(self):
+        data = construct_request(IppOperation.CUPS_GET_DEVICES, 1)
+
+        response_data = await self._request(self._construct_uri('', ''), data)
+
+        return {p['device-uri']: p for p in response_data['printers']}
+
+    async def get_document(self, printer: str, job_id: int, document_id: int):
+        data = construct_request(IppOperation.CUPS_GET_DOCUMENT, 1, operation_attributes={
+            'printer-uri': 'ipp://localhost/printers/{0}'.format(printer),
+            'job-id': job_id,
+            'document-number': document_id
+        })
+
+        response_data = await self._request(self._construct_uri('', ''), data, True)
+
+        if response_data['data']:
+            with NamedTemporaryFile(delete=False) as tmp_file:
+                tmp_file_name = tmp_file.name
+
+                tmp_file.write(response_data['data'])
+
+            return tmp_file_name
+
+        return None
+
+    async def move_job(self, job_id: int, destination_printer: str):
+        data = construct_request(IppOperation.CUPS_MOVE_JOB, 1, {
+            'job-uri': 'ipp://localhost/jobs/{0}'.format(job_id),
+            'requesting-user-name': self.user
+        }, job_attributes={
+            'job-printer-uri': 'ipp://localhost/printers/{0}'.format(destination_printer),
+        })
+
+        await self._request(self._construct_uri('jobs', ''), data)
+
+        return True
+
+    async def move_all_jobs(self, source_printer: str, destination_printer: str):
+        data = construct_request(IppOperation.CUPS_MOVE_JOB, 1, {
+            'printer-uri': 'ipp://localhost/printers/{0}'.format(source_printer),
+            'requesting-user-name': self.user
+        }, job_attributes={
+            'job-printer-uri': 'ipp://localhost/printers/{0}'.format(destination_printer),
+        })
+
+        await self._request(self._construct_uri('jobs', ''), data)
+
+        return True
+
+    async def get_ppds(self):
+        data = construct_request(IppOperation.CUPS_GET_PPDS, 1)
+
+        response_data = await self._request(self._construct_uri('', ''), data)
+
+        return {p['ppd-name']: p for p in response_data['printers']}
+
+    async def accept_jobs(self, printer: str):
+        data = construct_request(IppOperation.CUPS_ACCEPT_JOBS, 1, {
+            'printer-uri': 'ipp://localhost/printers/{0}'.format(printer)
+        })
+
+        await self._request(self._construct_uri('admin', ''), data)
+
+        return True
+
+    async def reject_jobs(self, printer: str):
+        data = construct_request(IppOperation.CUPS_REJECT_JOBS, 1, {
+            'printer-uri': 'ipp://localhost/printers/{0}'.format(printer)
+        })
+
+        await self._request(self._construct_uri('admin', ''), data)
+
+        return True
+
+    async def add_printer_to_class(self, clazz: str, printer: str):
+        class_uri = 'ipp://localhost/classes/{0}'.format(clazz)
+        printer_uri = 'ipp://localhost/printers/{0}'.format(printer)
+
+        try:
+            # get current class members
+            members = (await self.get_printer_attributes(clazz, ['member-uris']))['member-uris']
+
+            # if class already exists, add printer to members
+            # return True if printer is aleady a member
+            if isinstance(members, list):
+                if printer_uri in members:
+                    return True
+
+                members.append(printer_uri)
+            else:
+                if members == printer_uri:
+                    return True
+
+                members = [members, printer_uri]
+        except IppException:
+            # if class doesn't exists, set members to printer rui
+            members = printer_uri
+
+        data = construct_request(IppOperation.CUPS_ADD_MODIFY_CLASS, 1, operation_attributes={
+            'printer-uri': class_uri
+        }, printer_attributes={
+            'member-uris': members
+        })
+
+        await self._request(self._construct_uri('admin', ''), data)
+
+        return True
+
+    async def delete_printer_from_class(self, clazz: str, printer: str):
+        class_uri = 'ipp://localhost/classes/{0}'.format(clazz)
+
+        try:
+            # get current class members
+            members = (await self.get_printer_attributes(clazz, ['member-uris']))['member-uris']
+        except IppException:
+            return True
+
+        if isinstance(members, list):
+            # update class if members are more then one
+            members.remove('ipp://{0}:{1}/printers/{2}'.format(self.host, self.port, printer))
+
+            data = construct_request(IppOperation.CUPS_ADD_MODIFY_CLASS, 1, operation_attributes={
+                'printer-uri': class_uri
+            }, printer_attributes={
+                'member-uris': members
+            })
+        else:
+            # delete class if only one member
+            data = construct_request(IppOperation.CUPS_DELETE_CLASS, 1, operation_attributes={
+                'printer-uri': class_uri
+            })
+
+        await self._request(self._construct_uri('admin', ''), data)
+
+        return True
+
+    async def delete_class(self, clazz: str):
+        data = construct_request(IppOperation.CUPS_DELETE_PRINTER, 1, {
+            'printer-uri': 'ipp://localhost/classes/{0}'.format(clazz)
+        })
+
+        await self._request(self._construct_uri('admin', ''), data)
+
+        return True
+
+    async def create_printer(self, name, device_uri='/dev/null', ppd='raw', is_shared=False,
+                             error_policy='stop-printer', information='', location=''):
+        data = construct_request(IppOperation.CUPS_ADD_MODIFY_PRINTER, 1, {
+            'printer-uri': 'ipp://localhost/printers/{0}'.format(name),
+            'ppd-name': ppd,
+            'printer-is-shared': is_shared
+        }, printer_attributes={
+            'printer-state-reason': 'none',
+            'device-uri': device_uri,
+            'printer-error-policy': error_policy,
+            'printer-info': information,
+            'printer-location': location
+        })
+
+        await self._request(self._construct_uri('admin', ''), data)
+
+        return True
+
+    async def _modify_printer(self, printer: str, operation_attributes=None, printer_attributes=None):
+        attributes = {'printer-uri': 'ipp://localhost/printers/{0}'.format(printer)}
+        attributes.update(operation_attributes or {})
+
+        data = construct_request(IppOperation.CUPS_ADD_MODIFY_PRINTER, 1, attributes,
+                                 printer_attributes=printer_attributes)
+
+        await self._request(self._construct_uri('admin', ''), data)
+
+        return True
+
+    async def set_printer_ppd(self, printer: str, ppd_name: str):
+        return await self._modify_printer(printer, {'ppd-name': ppd_name})
+
+    async def set_printer_device_uri(self, printer: str, device_uri: str):
+        return await self._modify_printer(printer, printer_attributes={'device-uri': device_uri})
+
+    async def set_printer_shared(self, printer: str, is_shared=False):
+        return await self._modify_printer(printer, {'printer-is-shared': is_shared})
+
+    async def set_printer_error_policy(self, printer: str, error_policy: str):
+        return await self._modify_printer(printer, printer_attributes={'printer-error-policy': error_policy})
+
+    async def set_printer_information(self, printer: str, information: str):
+        return await self._modify_printer(printer, printer_attributes={'printer-info': information})
+
+    async def set_printer_location(self, printer: str, location: str):
+        return await self._modify_printer(printer, printer_attributes={'printer-location': location})
+
+    async def delete_printer(self, printer: str):
+        data = construct_request(IppOperation.CUPS_DELETE_PRINTER, 1, {
+            'printer-uri': 'ipp://localhost/printers/{0}'.format(printer)
+        })
+
+        await self._request(self._construct_uri('admin', ''), data)
+
+        return True
+
+    async def get_printers(self, attributes=None):
+        data = construct_request(IppOperation.CUPS_GET_PRINTERS, 1, {
+            'requesting-user-name': self.user,
+            'requested-attributes': attributes + ['printer-name'] if attributes else IPP_DEFAULT_PRINTER_ATTRIBUTES
+        })
+
+        response_data = await self._request(self._construct_uri('', ''), data)
+
+        return {p['printer-name']: p for p in response_data['printers']}
+
+    async def get_classes(self, attributes=None):
+        data = construct_request(IppOperation.CUPS_GET_CLASSES, 1, {
+            'requesting-user-name': self.user,
+            'requested-attributes': attributes + ['printer-name'] if attributes else IPP_DEFAULT_CLASS_ATTRIBUTES
+        })
+
+        response_data = await self._request(self._construct_uri('', ''), data)
+
+        return {p['printer-name']: p for p in response_data['printers']}
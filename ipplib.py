@@ -1,10 +1,27 @@
 import struct
+import sys
 import base64
 import http.client
 import getpass
 import copy
 import os
 import ssl
+import mmap
+import select
+import socket
+import threading
+import time
+import contextlib
+import concurrent.futures
+import collections
+import collections.abc
+import itertools
+import array
+import bisect
+import json
+import random
+import heapq
+import zlib
 from enum import IntEnum
 from tempfile import NamedTemporaryFile
 
@@ -20,6 +37,71 @@ IPP_DEFAULT_JOB_ATTRIBUTES = ["job-id", "job-name", 'printer-uri', "job-state",
                               "job-media-progress", "job-k-octets", "number-of-documents", "copies",
                               'job-originating-user-name']
 
+# banner file rendered by cups as test page
+IPP_TEST_PAGE = bytes('#PDF-BANNER\n' +
+                      'Template default-testpage.pdf\n' +
+                      'Show printer-name printer-info printer-location printer-make-and-model printer-driver-name' +
+                      'printer-driver-version paper-size imageable-area job-id options time-at-creation' +
+                      'time-at-processing\n\n', 'utf-8')
+
+# size of the blocks sent per call when a document can't be uploaded with sendfile
+IPP_UPLOAD_BLOCK_SIZE = 1024 * 1024
+
+# supported values of a printer which are needed to submit jobs
+IPP_CAPABILITY_ATTRIBUTES = ['compression-supported', 'operations-supported']
+
+# seconds to wait for the interim 100 response before a document is uploaded without it
+IPP_EXPECT_CONTINUE_TIMEOUT = 1.0
+
+# seconds to wait for a free pooled connection, e.g. a request while a stream_* generator of the client is open
+IPP_CONNECTION_ACQUIRE_TIMEOUT = 60.0
+
+# size of the blocks read from the http response by the streaming methods
+IPP_RESPONSE_CHUNK_SIZE = 64 * 1024
+
+IPP_DEFAULT_PRINTER_EVENTS = ['printer-state-changed', 'job-created', 'job-state-changed', 'job-completed']
+IPP_DEFAULT_JOB_EVENTS = ['job-state-changed', 'job-completed']
+
+# seconds until a printer subscription expires, event streams renew it after half of the time
+IPP_SUBSCRIPTION_LEASE_DURATION = 3600
+
+# number of jobs requested per get jobs request by iter_jobs
+IPP_JOB_PAGE_SIZE = 500
+
+# integer columns of an IppJobTable, missing values are stored as 0
+IPP_JOB_TABLE_COLUMNS = ['job-id', 'job-state', 'job-k-octets', 'copies', 'time-at-creation', 'time-at-processing',
+                         'time-at-completed']
+
+# attributes of a control file which are kept by CupsSpoolIndex
+IPP_SPOOL_INDEX_ATTRIBUTES = IPP_JOB_TABLE_COLUMNS + ['job-name', 'job-originating-user-name', 'job-printer-uri']
+
+# minimum number of changed control files which are parsed by a process pool
+IPP_SPOOL_PARALLEL_THRESHOLD = 256
+
+# seconds a CupsCluster uses the queue states of its backends before it requests them again
+IPP_CLUSTER_REFRESH_INTERVAL = 10.0
+
+# seconds a failed backend of a CupsCluster isn't used before it is tried again
+IPP_CLUSTER_RETRY_INTERVAL = 60.0
+
+# seconds between two status checks of a job by IppJobWaiter, the interval grows while the job doesn't change
+IPP_JOB_POLL_MIN_INTERVAL = 0.5
+IPP_JOB_POLL_MAX_INTERVAL = 30.0
+
+# seconds between two get notifications requests without events if the printer doesn't suggest an interval
+IPP_NOTIFY_POLL_INTERVAL = 5.0
+
+# requests sent ahead of their responses on a pipelined connection
+IPP_PIPELINE_DEPTH = 16
+
+# operations run concurrently by an IppSubmissionScheduler while the server isn't overloaded
+IPP_SCHEDULER_MAX_CONCURRENCY = 8
+
+# attempts of an operation failing with a retryable status, the backoff doubles from the base up to the max delay
+IPP_RETRY_MAX_ATTEMPTS = 5
+IPP_RETRY_BASE_DELAY = 0.5
+IPP_RETRY_MAX_DELAY = 30.0
+
 
 class IppStatus(IntEnum):
     CUPS_INVALID = -1
@@ -311,7 +393,81 @@ _IPP_ATTRIBUTE_TAG_MAP = {
     'document-number': IppTag.INTEGER,
     'printer-state': IppTag.ENUM,
     'document-state': IppTag.ENUM,
-    'device-uri': IppTag.URI
+    'device-uri': IppTag.URI,
+    'compression': IppTag.KEYWORD,
+    'notify-events': IppTag.KEYWORD,
+    'notify-pull-method': IppTag.KEYWORD,
+    'notify-lease-duration': IppTag.INTEGER,
+    'notify-time-interval': IppTag.INTEGER,
+    'notify-job-id': IppTag.INTEGER,
+    'notify-subscription-id': IppTag.INTEGER,
+    'notify-subscription-ids': IppTag.INTEGER,
+    'notify-sequence-numbers': IppTag.INTEGER,
+    'notify-wait': IppTag.BOOLEAN,
+    'job-ids': IppTag.INTEGER,
+    'limit': IppTag.INTEGER,
+    'first-index': IppTag.INTEGER,
+    'first-job-id': IppTag.INTEGER
+}
+
+# zlib window bits of the ipp compression keywords, gzip (rfc 1952) and raw deflate (rfc 1951)
+_IPP_COMPRESSION_WBITS = {
+    'gzip': 16 + zlib.MAX_WBITS,
+    'deflate': -zlib.MAX_WBITS
+}
+
+# encoded name-length + name of the attributes in _IPP_ATTRIBUTE_TAG_MAP
+_IPP_ATTRIBUTE_PREFIX_CACHE = {}
+
+# interned attribute names of the decoded responses by their encoded name, shared by all parsed groups
+_IPP_ATTRIBUTE_NAME_CACHE = {}
+_IPP_ATTRIBUTE_NAME_CACHE_SIZE = 4096
+
+# schemas of the IppRecords by their attribute names
+_IPP_RECORD_SCHEMAS = {}
+
+# maximum number of shared string values of an IppResponseDecoder
+_IPP_SHARED_STRINGS_SIZE = 4096
+
+_STRUCT_SHORT = struct.Struct('>h')
+_STRUCT_INTEGER_VALUE = struct.Struct('>hi')
+_STRUCT_BOOLEAN_VALUE = struct.Struct('>h?')
+_STRUCT_ADDITIONAL_VALUE = struct.Struct('>bh')
+_STRUCT_REQUEST_HEADER = struct.Struct('>bbhib')
+_STRUCT_RESPONSE_HEADER = struct.Struct('>bbhi')
+_STRUCT_LENGTH = struct.Struct('>H')
+_STRUCT_INTEGER = struct.Struct('>i')
+_STRUCT_BOOLEAN = struct.Struct('>?')
+_STRUCT_SIGNED_BYTE = struct.Struct('>b')
+_STRUCT_RESOLUTION = struct.Struct('>iib')
+
+# tags below this value are delimiters of attribute groups
+_IPP_FIRST_VALUE_TAG = IppTag.UNSUPPORTED_VALUE.value
+_IPP_TAG_END = IppTag.END.value
+_IPP_TAG_ENUM = IppTag.ENUM.value
+
+_IPP_LAST_SUCCESSFUL_STATUS = 0x00ff
+
+# request ids are 1 to 2**31 - 1 (rfc 8011 4.1.2)
+_IPP_MAX_REQUEST_ID = 0x7fffffff
+
+_IPP_GROUP_KEYS = {
+    IppTag.OPERATION.value: 'operation-attributes',
+    IppTag.JOB.value: 'jobs',
+    IppTag.PRINTER.value: 'printers',
+    IppTag.SUBSCRIPTION.value: 'subscriptions',
+    IppTag.EVENT_NOTIFICATION.value: 'events'
+}
+
+_IPP_TERMINAL_JOB_STATES = frozenset((IppJobState.COMPLETED, IppJobState.CANCELED, IppJobState.ABORTED))
+
+# cups returns the active jobs sorted by priority instead of job id
+_IPP_ACTIVE_WHICH_JOBS = frozenset(('not-completed', 'pending', 'pending-held', 'processing', 'processing-stopped'))
+
+_IPP_ENUM_ATTRIBUTE_TYPES = {
+    'job-state': IppJobState,
+    'printer-state': IppPrinterState,
+    'document-state': IppDocumentState
 }
 
 
@@ -328,58 +484,252 @@ class IppException(Exception):
         return '{0} - {1}'.format(self.code, self.message)
 
 
+# operations which are safe to repeat if a kept-alive connection was closed by the server
+_IPP_IDEMPOTENT_OPERATIONS = {
+    IppOperation.VALIDATE_JOB,
+    IppOperation.GET_JOB_ATTRIBUTES,
+    IppOperation.GET_JOBS,
+    IppOperation.GET_PRINTER_ATTRIBUTES,
+    IppOperation.GET_PRINTER_SUPPORTED_VALUES,
+    IppOperation.GET_SUBSCRIPTION_ATTRIBUTES,
+    IppOperation.GET_SUBSCRIPTIONS,
+    IppOperation.GET_DOCUMENT_ATTRIBUTES,
+    IppOperation.GET_DOCUMENTS,
+    IppOperation.GET_PRINTERS,
+    IppOperation.GET_SYSTEM_ATTRIBUTES,
+    IppOperation.CUPS_GET_DEFAULT,
+    IppOperation.CUPS_GET_PRINTERS,
+    IppOperation.CUPS_GET_CLASSES,
+    IppOperation.CUPS_GET_DEVICES,
+    IppOperation.CUPS_GET_PPDS,
+    IppOperation.CUPS_GET_PPD,
+    IppOperation.CUPS_GET_DOCUMENT
+}
+
+# statuses of an overloaded or temporarily unavailable server, the operation can succeed later
+IPP_RETRYABLE_STATUSES = frozenset([
+    IppStatus.ERROR_SERVICE_UNAVAILABLE,
+    IppStatus.ERROR_TEMPORARY,
+    IppStatus.ERROR_BUSY,
+    IppStatus.ERROR_TOO_MANY_JOBS
+])
+
+# errors raised when a request is sent on a connection the server has closed
+_IPP_STALE_CONNECTION_ERRORS = (http.client.BadStatusLine, ConnectionResetError, ConnectionAbortedError,
+                                BrokenPipeError)
+
+# errors of a request which concern only the server it was sent to
+_IPP_REQUEST_ERRORS = (IppException, IppTransportException, OSError, http.client.HTTPException)
+
+
 def update_attribute_tag_map(attribute: str, tag: IppTag):
     _IPP_ATTRIBUTE_TAG_MAP[attribute] = tag
 
 
-def __construct_attibute_values(tag: IppTag, value):
-    bs = b''
+def _attribute_name_prefix(name: str):
+    # name-length and name are the same for every occurrence of an attribute,
+    # so the encoded prefix of known attributes is built only once
+    prefix = _IPP_ATTRIBUTE_PREFIX_CACHE.get(name)
 
-    if tag in (IppTag.INTEGER, IppTag.ENUM):
-        bs += struct.pack('>h', 4)
-        bs += struct.pack('>i', value)
-    elif tag == IppTag.BOOLEAN:
-        bs += struct.pack('>h', 1)
-        bs += struct.pack('>?', value)
-    else:
-        bs += struct.pack('>h', len(value))
-        bs += value.encode('utf-8')
+    if prefix is None:
+        encoded_name = name.encode('utf-8')
+        prefix = _STRUCT_SHORT.pack(len(encoded_name)) + encoded_name
 
-    return bs
+        if name in _IPP_ATTRIBUTE_TAG_MAP:
+            _IPP_ATTRIBUTE_PREFIX_CACHE[name] = prefix
 
+    return prefix
 
-def construct_attribute(name: str, value, tag=None):
-    bs = b''
 
+def _encode_attribute_value(buffer: bytearray, tag: int, value):
+    if tag == IppTag.INTEGER or tag == IppTag.ENUM:
+        buffer += _STRUCT_INTEGER_VALUE.pack(4, value)
+    elif tag == IppTag.BOOLEAN:
+        buffer += _STRUCT_BOOLEAN_VALUE.pack(1, value)
+    else:
+        encoded_value = value.encode('utf-8')
+        buffer += _STRUCT_SHORT.pack(len(encoded_value))
+        buffer += encoded_value
+
+
+def _encode_attribute(buffer: bytearray, name: str, value, tag=None):
     if not tag:
         tag = _IPP_ATTRIBUTE_TAG_MAP.get(name, None)
 
     if not tag:
-        return bs
+        return
 
-    if isinstance(value, list) or isinstance(value, tuple) or isinstance(value, set):
-        for index, v in enumerate(value):
-            bs += struct.pack('>b', tag.value)
+    tag = int(tag)
 
+    if isinstance(value, (list, tuple, set)):
+        for index, v in enumerate(value):
             if index == 0:
-                bs += struct.pack('>h', len(name))
-                bs += name.encode('utf-8')
+                buffer.append(tag)
+                buffer += _attribute_name_prefix(name)
             else:
-                bs += struct.pack('>h', 0)
+                buffer += _STRUCT_ADDITIONAL_VALUE.pack(tag, 0)
+
+            _encode_attribute_value(buffer, tag, v)
+    else:
+        buffer.append(tag)
+        buffer += _attribute_name_prefix(name)
+
+        _encode_attribute_value(buffer, tag, value)
+
+
+def construct_attribute(name: str, value, tag=None):
+    buffer = bytearray()
+    _encode_attribute(buffer, name, value, tag)
+
+    return bytes(buffer)
+
+
+def _decode_integer(data, offset: int, length: int):
+    return _STRUCT_INTEGER.unpack_from(data, offset)[0]
+
+
+def _decode_boolean(data, offset: int, length: int):
+    return _STRUCT_BOOLEAN.unpack_from(data, offset)[0]
+
+
+def _decode_date(data, offset: int, length: int):
+    return _STRUCT_SIGNED_BYTE.unpack_from(data, offset)[0]
+
+
+def _decode_reserved_string(data, offset: int, length: int):
+    if length > 0:
+        return str(data[offset:offset + length], 'utf-8')
+
+    return None
+
+
+def _decode_range(data, offset: int, length: int):
+    return [_STRUCT_INTEGER.unpack_from(data, offset + i * 4)[0] for i in range(length // 4)]
 
-            bs += __construct_attibute_values(tag, v)
+
+def _decode_resolution(data, offset: int, length: int):
+    return _STRUCT_RESOLUTION.unpack_from(data, offset)
+
+
+def _decode_string(data, offset: int, length: int):
+    return str(data[offset:offset + length], 'utf-8')
+
+
+_IPP_VALUE_DECODERS = {
+    IppTag.INTEGER.value: _decode_integer,
+    IppTag.ENUM.value: _decode_integer,
+    IppTag.BOOLEAN.value: _decode_boolean,
+    IppTag.DATE.value: _decode_date,
+    IppTag.RESERVED_STRING.value: _decode_reserved_string,
+    IppTag.RANGE.value: _decode_range,
+    IppTag.RESOLUTION.value: _decode_resolution
+}
+
+
+def _decode_attribute(data, offset: int):
+    """
+    decodes the attribute at offset without any intermediate objects
+
+    returns a (tag, name, value, next offset) tuple, name is empty for additional values of a multi-valued attribute
+    """
+
+    tag = data[offset]
+
+    name_length = _STRUCT_LENGTH.unpack_from(data, offset + 1)[0]
+    offset += 3
+
+    if name_length:
+        encoded_name = data[offset:offset + name_length].tobytes()
+        name = _IPP_ATTRIBUTE_NAME_CACHE.get(encoded_name)
+
+        if name is None:
+            name = sys.intern(str(encoded_name, 'utf-8'))
+
+            if len(_IPP_ATTRIBUTE_NAME_CACHE) < _IPP_ATTRIBUTE_NAME_CACHE_SIZE:
+                _IPP_ATTRIBUTE_NAME_CACHE[encoded_name] = name
     else:
-        bs = struct.pack('>b', tag.value)
+        name = ''
+
+    offset += name_length
+
+    value_length = _STRUCT_LENGTH.unpack_from(data, offset)[0]
+    offset += 2
+
+    value = _IPP_VALUE_DECODERS.get(tag, _decode_string)(data, offset, value_length)
+
+    if tag == _IPP_TAG_ENUM and name in _IPP_ENUM_ATTRIBUTE_TYPES:
+        value = _IPP_ENUM_ATTRIBUTE_TYPES[name](value)
+
+    return tag, name, value, offset + value_length
+
+
+class _IppRecordSchema:
+    __slots__ = ('names', 'indexes')
+
+    def __init__(self, names: tuple):
+        self.names = names
+        self.indexes = {name: i for i, name in enumerate(names)}
+
+
+class IppRecord(collections.abc.Mapping):
+    """
+    read-only mapping of an attribute group, returned by the parser when records=True
+
+    records with the same attribute names share one schema, so a record only holds a tuple of its values
+    instead of a dict with its own keys. strings is an optional dict shared by the records of one response to store
+    repeated string values like keywords, uris and user names once
+    """
+
+    __slots__ = ('_schema', '_values')
+
+    def __init__(self, attributes: dict, strings=None):
+        names = tuple(attributes)
+        schema = _IPP_RECORD_SCHEMAS.get(names)
 
-        bs += struct.pack('>h', len(name))
-        bs += name.encode('utf-8')
+        if schema is None:
+            schema = _IPP_RECORD_SCHEMAS.setdefault(names, _IppRecordSchema(names))
 
-        bs += __construct_attibute_values(tag, value)
+        self._schema = schema
 
-    return bs
+        if strings is None:
+            self._values = tuple(attributes.values())
+            return
 
+        share = strings.setdefault
+        values = []
 
-def parse_response_without_check(ipp_raw_data: bytes, contains_data=False):
+        for value in attributes.values():
+            value_type = type(value)
+
+            if value_type is str:
+                value = share(value, value)
+            elif value_type is list:
+                value = [share(v, v) if type(v) is str else v for v in value]
+
+            values.append(value)
+
+        self._values = tuple(values)
+
+    def __getitem__(self, name):
+        return self._values[self._schema.indexes[name]]
+
+    def __contains__(self, name):
+        return name in self._schema.indexes
+
+    def __iter__(self):
+        return iter(self._schema.names)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return 'IppRecord({0!r})'.format(dict(self))
+
+    def __reduce__(self):
+        return IppRecord, (dict(self),)
+
+
+def parse_response_without_check(ipp_raw_data: bytes, contains_data=False, records=False):
     """
     1 byte: Protocol Major Version - b
     1 byte: Protocol Minor Version - b
@@ -393,74 +743,67 @@ def parse_response_without_check(ipp_raw_data: bytes, contains_data=False):
     1 byte: Attribute End Byte (\0x03)
     """
 
-    data = {}
-
-    offset = 0
+    view = memoryview(ipp_raw_data)
 
-    data['version'] = struct.unpack_from('>bb', ipp_raw_data, offset)
-    offset += 2
-
-    data['status-code'] = struct.unpack_from('>h', ipp_raw_data, offset)[0]
-    offset += 2
+    major_version, minor_version, status_code, request_id = _STRUCT_RESPONSE_HEADER.unpack_from(view, 0)
 
-    data['request-id'] = struct.unpack_from('>i', ipp_raw_data, offset)[0]
-    offset += 4
+    data = {
+        'version': (major_version, minor_version),
+        'status-code': status_code,
+        'request-id': request_id,
+        'operation-attributes': [],
+        'jobs': [],
+        'printers': [],
+        'subscriptions': [],
+        'events': [],
+        'data': b''
+    }
 
-    data['operation-attributes'] = []
-    data['jobs'] = []
-    data['printers'] = []
-    data['data'] = b''
+    offset = _STRUCT_RESPONSE_HEADER.size
 
-    attribute_key = ''
+    attribute_key = None
+    attributes = {}
     previous_attribute_name = ''
-    tmp_data = {}
+    strings = {}
 
-    while struct.unpack_from('b', ipp_raw_data, offset)[0] != IppTag.END.value:
-        # check for operation, job or printer attribute start byte
-        # if tmp data and attribute key is set, a another operation was send -> add it and reset tmp data
-        if struct.unpack_from('b', ipp_raw_data, offset)[0] == IppTag.OPERATION.value:
-            if tmp_data and attribute_key:
-                data[attribute_key].append(tmp_data)
-                tmp_data = {}
+    while True:
+        tag = view[offset]
 
-            attribute_key = 'operation-attributes'
-            offset += 1
-        elif struct.unpack_from('b', ipp_raw_data, offset)[0] == IppTag.JOB.value:
-            if tmp_data and attribute_key:
-                data[attribute_key].append(tmp_data)
-                tmp_data = {}
+        # check for a delimiter tag (operation, job, printer or end byte)
+        # the attributes of the previous group are complete -> add them to the result
+        if tag < _IPP_FIRST_VALUE_TAG:
+            if attribute_key and (attributes or tag == _IPP_TAG_END):
+                if records and attribute_key != 'operation-attributes':
+                    attributes = IppRecord(attributes, strings)
 
-            attribute_key = 'jobs'
-            offset += 1
-        elif struct.unpack_from('b', ipp_raw_data, offset)[0] == IppTag.PRINTER.value:
-            if tmp_data and attribute_key:
-                data[attribute_key].append(tmp_data)
-                tmp_data = {}
+                data[attribute_key].append(attributes)
 
-            attribute_key = 'printers'
+            if tag == _IPP_TAG_END:
+                break
+
+            # groups which aren't part of the result are parsed, but dropped
+            attribute_key = _IPP_GROUP_KEYS.get(tag)
+            attributes = {}
             offset += 1
 
-        attribute, new_offset = parse_attribute(ipp_raw_data, offset)
+            continue
 
-        # print(attribute)
+        tag, name, value, offset = _decode_attribute(view, offset)
 
         # if attribute have a name -> add it
         # if attribute doesn't habe a name -> it is part of an array
-        if attribute['name']:
-            tmp_data[attribute['name']] = attribute['value']
-            previous_attribute_name = attribute['name']
+        if name:
+            attributes[name] = value
+            previous_attribute_name = name
         elif previous_attribute_name:
             # check if attribute is already an array
             # else convert is to an array
-            if isinstance(tmp_data[previous_attribute_name], list):
-                tmp_data[previous_attribute_name].append(attribute['value'])
-            else:
-                tmp_value = tmp_data[previous_attribute_name]
-                tmp_data[previous_attribute_name] = [tmp_value, attribute['value']]
+            previous_value = attributes[previous_attribute_name]
 
-        offset = new_offset
-
-    data[attribute_key].append(tmp_data)
+            if isinstance(previous_value, list):
+                previous_value.append(value)
+            else:
+                attributes[previous_attribute_name] = [previous_value, value]
 
     if data['operation-attributes']:
         data['operation-attributes'] = data['operation-attributes'][0]
@@ -471,8 +814,8 @@ def parse_response_without_check(ipp_raw_data: bytes, contains_data=False):
     return data
 
 
-def parse_response(ipp_raw_data: bytes, contains_data=False):
-    data = parse_response_without_check(ipp_raw_data, contains_data)
+def parse_response(ipp_raw_data: bytes, contains_data=False, records=False):
+    data = parse_response_without_check(ipp_raw_data, contains_data, records)
 
     _check_response_for_errors(data)
 
@@ -488,316 +831,1978 @@ def parse_attribute(data: bytes, offset: int):
     N bytes: Value - direct access
     """
 
+    tag, name, value, next_offset = _decode_attribute(memoryview(data), offset)
+
+    name_length = _STRUCT_LENGTH.unpack_from(data, offset + 1)[0]
+
     attribute = {
-        'tag': struct.unpack_from('>b', data, offset)[0]
+        'tag': tag,
+        'name-length': name_length,
+        'name': name,
+        'value-length': next_offset - offset - 5 - name_length,
+        'value': value
     }
 
-    offset += 1
+    return attribute, next_offset
 
-    attribute['name-length'] = struct.unpack_from('>h', data, offset)[0]
-    offset += 2
 
-    attribute['name'] = data[offset:offset + attribute['name-length']].decode('utf-8')
-    offset += attribute['name-length']
+class IppResponseDecoder:
+    """
+    incremental decoder for ipp responses
 
-    attribute['value-length'] = struct.unpack_from('>h', data, offset)[0]
-    offset += 2
+    feed() takes the response in arbitrary chunks and returns the attribute groups completed by it as
+    (group key, attributes) tuples, so only the current group and the undecoded rest of the last chunk are held
+    """
 
-    if attribute['tag'] in (IppTag.ENUM.value, IppTag.INTEGER.value):
-        attribute['value'] = struct.unpack_from('>i', data, offset)[0]
-
-        if attribute['tag'] == IppTag.ENUM.value:
-            if attribute['name'] == 'job-state':
-                attribute['value'] = IppJobState(attribute['value'])
-            elif attribute['name'] == 'printer-state':
-                attribute['value'] = IppPrinterState(attribute['value'])
-            elif attribute['name'] == 'document-state':
-                attribute['value'] = IppDocumentState(attribute['value'])
-
-        offset += 4
-    elif attribute['tag'] == IppTag.BOOLEAN.value:
-        attribute['value'] = struct.unpack_from('>?', data, offset)[0]
-        offset += 1
-    elif attribute['tag'] == IppTag.DATE.value:
-        attribute['value'] = struct.unpack_from('>' + 'b' * attribute['value-length'], data, offset)[0]
-        offset += attribute['value-length']
-    elif attribute['tag'] == IppTag.RESERVED_STRING.value:
-        if attribute['value-length'] > 0:
-            attribute['value'] = data[offset:offset + attribute['value-length']].decode('utf-8')
-            offset += attribute['value-length']
-        else:
-            attribute['value'] = None
-    elif attribute['tag'] == IppTag.RANGE.value:
-        attribute['value'] = []
-        for i in range(int(attribute['value-length'] / 4)):
-            attribute['value'].append(struct.unpack_from('>i', data, offset + i * 4)[0])
-        offset += attribute['value-length']
-    elif attribute['tag'] == IppTag.RESOLUTION.value:
-        attribute['value'] = struct.unpack_from('>iib', data, offset)
-        offset += attribute['value-length']
-    else:
-        attribute['value'] = data[offset:offset + attribute['value-length']].decode('utf-8')
-        offset += attribute['value-length']
+    def __init__(self, records=False):
+        self._records = records
+        self._strings = {}
+        self._buffer = bytearray()
+        self._attribute_key = None
+        self._attributes = {}
+        self._previous_attribute_name = ''
 
-    return attribute, offset
+        self.version = None
+        self.status_code = None
+        self.request_id = None
+        self.finished = False
 
+    @staticmethod
+    def _attribute_end(data, offset: int):
+        # returns the offset behind the attribute or -1 if the attribute isn't complete yet
+        size = len(data)
 
-def _check_response_for_errors(response):
-    if response['status-code'] != 0:
-        raise IppException(response['operation-attributes']['status-message'], response['status-code'])
+        if offset + 3 > size:
+            return -1
 
+        name_end = offset + 3 + _STRUCT_LENGTH.unpack_from(data, offset + 1)[0]
 
-def construct_request(operation: IppOperation, request_id: int, operation_attributes=None, job_attributes=None,
-                      printer_attributes=None):
-    data = struct.pack('>bb', *IPP_PROTO_VERSION)
-    data += struct.pack('>h', operation.value)
-    data += struct.pack('>i', request_id)
+        if name_end + 2 > size:
+            return -1
 
-    data += struct.pack('>b', IppTag.OPERATION.value)
+        end = name_end + 2 + _STRUCT_LENGTH.unpack_from(data, name_end)[0]
 
-    data += construct_attribute('attributes-charset', IPP_CHARSET)
-    data += construct_attribute('attributes-natural-language', IPP_CHARSET_LANGUAGE)
+        return end if end <= size else -1
 
-    if isinstance(operation_attributes, dict):
-        for attr, value in operation_attributes.items():
-            data += construct_attribute(attr, value)
+    def feed(self, chunk: bytes):
+        if self.finished:
+            return []
 
-    if isinstance(job_attributes, dict):
-        data += struct.pack('>b', IppTag.JOB.value)
+        self._buffer += chunk
 
-        for attr, value in job_attributes.items():
-            data += construct_attribute(attr, value)
+        groups = []
+        offset = 0
+        view = memoryview(self._buffer)
 
-    if isinstance(printer_attributes, dict):
-        data += struct.pack('>b', IppTag.PRINTER.value)
+        try:
+            if self.status_code is None:
+                if len(view) < _STRUCT_RESPONSE_HEADER.size:
+                    return groups
 
-        for attr, value in printer_attributes.items():
-            data += construct_attribute(attr, value)
+                major_version, minor_version, self.status_code, self.request_id = \
+                    _STRUCT_RESPONSE_HEADER.unpack_from(view, 0)
+                self.version = (major_version, minor_version)
 
-    data += struct.pack('>b', IppTag.END.value)
+                offset = _STRUCT_RESPONSE_HEADER.size
 
-    return data
+            while offset < len(view):
+                tag = view[offset]
 
+                if tag < _IPP_FIRST_VALUE_TAG:
+                    if self._attribute_key and (self._attributes or tag == _IPP_TAG_END):
+                        attributes = self._attributes
 
-class IppClient:
-    def __init__(self, host, port=631, user=None, password=None, use_ssl=True, verify_certificate=True):
-        self.__host = host
-        self.__port = port
-        self.__user = user if user else getpass.getuser()
+                        if self._records and self._attribute_key != 'operation-attributes':
+                            attributes = IppRecord(attributes, self._strings)
 
-        if use_ssl:
-            self._connection = http.client.HTTPSConnection(
-                self.__host, port=self.__port,
-                context=ssl._create_unverified_context() if not verify_certificate else None)
-        else:
-            self._connection = http.client.HTTPConnection(self.__host, port=self.__port)
+                            # the streamed records aren't kept, unique strings like job names shouldn't pile up
+                            if len(self._strings) > _IPP_SHARED_STRINGS_SIZE:
+                                self._strings.clear()
 
-        self.__headers = {
-            'Content-Type': 'application/ipp'
-        }
+                        groups.append((self._attribute_key, attributes))
 
-        if user and password:
-            self.__headers['Authorization'] = "Basic {0}".format(
-                base64.b64encode('{0}:{1}'.format(user, password).encode('utf-8')).decode('utf-8'))
+                    self._attribute_key = _IPP_GROUP_KEYS.get(tag)
+                    self._attributes = {}
+                    offset += 1
 
-        if not self.test_connection():
-            raise IppTransportException('Could not connect to IPP Server')
+                    if tag == _IPP_TAG_END:
+                        self.finished = True
+                        break
 
-    def __del__(self):
-        self._connection.close()
+                    continue
 
-    @property
-    def host(self):
-        return self.__host
+                if self._attribute_end(view, offset) < 0:
+                    break
 
-    @property
-    def port(self):
-        return self.__port
+                tag, name, value, offset = _decode_attribute(view, offset)
 
-    @property
-    def user(self):
-        return self.__user
+                if name:
+                    self._attributes[name] = value
+                    self._previous_attribute_name = name
+                elif self._previous_attribute_name:
+                    previous_value = self._attributes[self._previous_attribute_name]
 
-    @user.setter
-    def user(self, user):
-        self.__user = user
+                    if isinstance(previous_value, list):
+                        previous_value.append(value)
+                    else:
+                        self._attributes[self._previous_attribute_name] = [previous_value, value]
+        finally:
+            view.release()
 
-    def _construct_headers(self, data, expect_continue=False):
-        headers = copy.deepcopy(self.__headers)
-        headers['Content-Length'] = len(data)
-        if expect_continue:
-            headers['Expect'] = '100-continue'
+            del self._buffer[:offset]
 
-        return headers
+        return groups
 
-    def _construct_uri(self, namespace: str, ipp_object: str):
-        return "http://{0}:{1}/{2}/{3}".format(self.__host, self.__port, namespace, ipp_object)
 
-    def _get_response_data(self):
-        response = self._connection.getresponse()
-        if response.getcode() == 200:
-            return response.readall()
-        else:
-            raise IppTransportException('Error: {0}'.format(response.getcode()))
+def _check_response_for_errors(response):
+    # 0x0000 - 0x00ff are successful status codes, e.g. successful-ok-ignored-subscriptions
+    if response['status-code'] > _IPP_LAST_SUCCESSFUL_STATUS:
+        raise IppException(response['operation-attributes']['status-message'], response['status-code'])
 
-    def send_request(self, uri: str, operation: IppOperation, request_id: int, operation_attributes=None,
-                     job_attributes=None, printer_attributes=None):
 
-        data = construct_request(operation, request_id, operation_attributes, job_attributes, printer_attributes)
+def _assign_request_id(data: bytes, request_ids):
+    # the request ids passed to construct_request are placeholders, every request gets the next id of its client
+    data = bytearray(data)
+    _STRUCT_INTEGER.pack_into(data, 4, next(request_ids) % _IPP_MAX_REQUEST_ID + 1)
 
-        self._connection.request('POST', "http://{0}:{1}/{2}".format(self.__host, self.__port, uri),
-                                 headers=self._construct_headers(data), body=data)
+    return data
 
-        return parse_response(self._get_response_data())
 
-    def send_raw_request(self, uri: str, raw_request: bytes):
-        self._connection.request('POST', "http://{0}:{1}/{2}".format(self.__host, self.__port, uri),
-                                 headers=self._construct_headers(raw_request), body=raw_request)
+def _check_request_id(data: bytes, response_request_id: int):
+    # a response to another request means the connection is out of sync
+    request_id = _STRUCT_INTEGER.unpack_from(data, 4)[0]
+    if response_request_id != request_id:
+        raise IppTransportException('Response to request {0} received, expected {1}'.format(response_request_id,
+                                                                                             request_id))
 
-        return parse_response(self._get_response_data())
 
-    def print_file(self, printer: str, file_path: str, job_name=None, copies=1, priority=50):
-        if not os.path.exists(file_path):
-            return None
+def construct_request(operation: IppOperation, request_id: int, operation_attributes=None, job_attributes=None,
+                      printer_attributes=None, subscription_attributes=None):
+    buffer = bytearray(_STRUCT_REQUEST_HEADER.pack(IPP_PROTO_VERSION[0], IPP_PROTO_VERSION[1], operation.value,
+                                                   request_id, IppTag.OPERATION.value))
 
-        printer_uri = 'ipp://localhost/printers/{0}'.format(printer)
+    _encode_attribute(buffer, 'attributes-charset', IPP_CHARSET)
+    _encode_attribute(buffer, 'attributes-natural-language', IPP_CHARSET_LANGUAGE)
 
-        if not job_name:
-            job_name = os.path.basename(file_path)
+    if isinstance(operation_attributes, dict):
+        for attr, value in operation_attributes.items():
+            _encode_attribute(buffer, attr, value)
 
-        # construct request body part 1
-        # create job
-        data = construct_request(IppOperation.CREATE_JOB, 1, operation_attributes={
-            'printer-uri': printer_uri,
-            'requesting-user-name': self.__user,
-            'job-name': job_name
-        }, job_attributes={
-            'copies': copies,
-            'job-priority': priority
-        })
+    if isinstance(job_attributes, dict):
+        buffer.append(IppTag.JOB.value)
 
-        self._connection.request('POST', self._construct_uri('printers', printer),
-                                 headers=self._construct_headers(data, True), body=data)
+        for attr, value in job_attributes.items():
+            _encode_attribute(buffer, attr, value)
 
-        response_data = parse_response(self._get_response_data())
+    if isinstance(printer_attributes, dict):
+        buffer.append(IppTag.PRINTER.value)
 
-        job_id = response_data['jobs'][0]['job-id']
+        for attr, value in printer_attributes.items():
+            _encode_attribute(buffer, attr, value)
 
-        # construct request body part 2
-        # create document
-        data = construct_request(IppOperation.SEND_DOCUMENT, 2, operation_attributes={
-            'printer-uri': printer_uri,
-            'requesting-user-name': self.__user,
-            'job-id': job_id,
-            'document-name': job_name,
-            'document-format': 'application/octet-stream',
-            'last-document': True
-        })
+    if isinstance(subscription_attributes, dict):
+        buffer.append(IppTag.SUBSCRIPTION.value)
 
-        header = self._construct_headers(data)
-        header['Content-Length'] += os.path.getsize(file_path)
+        for attr, value in subscription_attributes.items():
+            _encode_attribute(buffer, attr, value)
 
-        # with open(file_path, 'rb') as doc_obj:
-        #     data += doc_obj.read()
-        #
-        # self._connection.request('POST', self._construct_uri('printers', printer),
-        #                          headers=self._construct_headers(data), body=data)
+    buffer.append(IppTag.END.value)
 
-        # send custom request
-        # send file in chunks
-        self._connection.putrequest('POST', self._construct_uri('printers', printer))
-        for header_name, header_value in header.items():
-            self._connection.putheader(header_name, header_value)
-        self._connection.endheaders()
+    return bytes(buffer)
 
-        self._connection.send(data)
-        with open(file_path, 'rb') as doc_obj:
-            self._connection.send(doc_obj)
 
-        parse_response(self._get_response_data())
+def _iter_document_blocks(document):
+    # yields the blocks of a document given as bytes, file-like object or iterable of bytes
+    if isinstance(document, (bytes, bytearray, memoryview)):
+        yield document
+    elif hasattr(document, 'read'):
+        while True:
+            block = document.read(IPP_UPLOAD_BLOCK_SIZE)
+            if not block:
+                break
 
-        return job_id
+            yield block
+    else:
+        for block in document:
+            yield block
 
-    def get_printer_attributes(self, printer: str, attributes=None):
-        printer_uri = 'ipp://localhost/printers/{0}'.format(printer)
 
-        # construct request body part 1
-        # create job
+def _compress_document_blocks(blocks, compression: str):
+    # compresses the blocks incrementally, the document is never held in memory as a whole
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, _IPP_COMPRESSION_WBITS[compression])
 
-        data = construct_request(IppOperation.GET_PRINTER_ATTRIBUTES, 1, {
-            'printer-uri': printer_uri,
-            'requesting-user-name': self.__user,
-            'requested-attributes': attributes if attributes else IPP_DEFAULT_PRINTER_ATTRIBUTES
-        })
+    for block in blocks:
+        compressed_block = compressor.compress(block)
+        if compressed_block:
+            yield compressed_block
 
-        self._connection.request('POST', self._construct_uri('printers', printer),
-                                 headers=self._construct_headers(data), body=data)
+    yield compressor.flush()
 
-        response_data = parse_response(self._get_response_data())
 
-        return response_data['printers'][0]
+class IppConnectionPool:
+    """
+    thread-safe pool of keep-alive connections to one ipp server
 
-    def resume_printer(self, printer: str):
-        printer_uri = 'ipp://localhost/printers/{0}'.format(printer)
+    at most size connections are open at the same time, acquire() blocks until one is released and raises an
+    IppTransportException after acquire_timeout seconds (None waits forever). idle connections are closed after
+    idle_timeout seconds or when the server has closed them in the meantime
+    """
 
-        data = construct_request(IppOperation.RESUME_PRINTER, 1, {
-            'printer-uri': printer_uri
-        })
+    def __init__(self, connection_factory, size=1, idle_timeout=30.0, acquire_timeout=IPP_CONNECTION_ACQUIRE_TIMEOUT):
+        self._connection_factory = connection_factory
+        self._size = size
+        self._idle_timeout = idle_timeout
+        self._acquire_timeout = acquire_timeout
 
-        self._connection.request('POST', self._construct_uri('admin', ''),
-                                 headers=self._construct_headers(data), body=data)
-        parse_response(self._get_response_data())
+        self._idle_connections = []
+        self._open_connections = 0
+        self._condition = threading.Condition()
 
-        return True
+    @property
+    def size(self):
+        return self._size
 
-    def pause_printer(self, printer: str):
-        printer_uri = 'ipp://localhost/printers/{0}'.format(printer)
+    def _is_healthy(self, connection, released_at: float):
+        if time.monotonic() - released_at > self._idle_timeout:
+            return False
 
-        data = construct_request(IppOperation.PAUSE_PRINTER, 1, {
-            'printer-uri': printer_uri
-        })
+        # not connected yet, the connection is established on the next request
+        if connection.sock is None:
+            return True
 
-        self._connection.request('POST', self._construct_uri('admin', ''),
-                                 headers=self._construct_headers(data), body=data)
-        parse_response(self._get_response_data())
+        # an idle keep-alive socket is only readable if the server has closed it
+        try:
+            readable, _, _ = select.select([connection.sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
 
-        return True
+        if not readable:
+            return True
 
-    def get_jobs(self, printer=None, which_jobs='not-completed', my_jobs=False, attributes=None):
-        data = construct_request(IppOperation.GET_JOBS, 1, {
-            'printer-uri': 'ipp://localhost/printers/{0}'.format(printer if printer else ''),
-            'which-jobs': which_jobs,
-            'my-jobs': my_jobs,
-            'requested-attributes': attributes + ['job-id'] if attributes else IPP_DEFAULT_JOB_ATTRIBUTES
-        })
+        # tls 1.3 session tickets make an idle connection readable without any data for the client
+        if isinstance(connection.sock, ssl.SSLSocket):
+            timeout = connection.sock.gettimeout()
+
+            try:
+                connection.sock.settimeout(0)
+                connection.sock.recv(1)
+            except ssl.SSLWantReadError:
+                return True
+            except OSError:
+                return False
+            finally:
+                try:
+                    connection.sock.settimeout(timeout)
+                except OSError:
+                    pass
+
+        return False
+
+    def acquire(self):
+        with self._condition:
+            while True:
+                while self._idle_connections:
+                    connection, released_at = self._idle_connections.pop()
+
+                    if self._is_healthy(connection, released_at):
+                        return connection
+
+                    connection.close()
+                    self._open_connections -= 1
+
+                if self._open_connections < self._size:
+                    self._open_connections += 1
+                    break
+
+                if not self._condition.wait(self._acquire_timeout):
+                    raise IppTransportException('No connection available within {0} seconds'.format(
+                        self._acquire_timeout))
 
-        self._connection.request('POST', self._construct_uri('', ''),
-                                 headers=self._construct_headers(data), body=data)
-        response_data = parse_response(self._get_response_data())
+        try:
+            return self._connection_factory()
+        except BaseException:
+            with self._condition:
+                self._open_connections -= 1
+                self._condition.notify()
+
+            raise
+
+    def release(self, connection, reusable=True):
+        with self._condition:
+            if reusable:
+                self._idle_connections.append((connection, time.monotonic()))
+            else:
+                connection.close()
+                self._open_connections -= 1
 
-        return {j['job-id']: j for j in response_data['jobs']}
+            self._condition.notify()
 
-    def get_job_attributes(self, job_id: int, attributes=None):
-        data = construct_request(IppOperation.GET_JOB_ATTRIBUTES, 1, {
-            'job-uri': 'ipp://localhost/jobs/{0}'.format(job_id),
-            'requested-attributes': attributes if attributes else IPP_DEFAULT_JOB_ATTRIBUTES
-        })
+    @contextlib.contextmanager
+    def connection(self):
+        connection = self.acquire()
 
-        self._connection.request('POST', self._construct_uri('', ''),
-                                 headers=self._construct_headers(data), body=data)
-        response_data = parse_response(self._get_response_data())
+        try:
+            yield connection
+        except IppException:
+            # ipp errors are raised after the response was read completely
+            self.release(connection)
+            raise
+        except BaseException:
+            self.release(connection, False)
+            raise
+        else:
+            self.release(connection)
 
-        return response_data['jobs'][0]
+    def close(self):
+        with self._condition:
+            for connection, _ in self._idle_connections:
+                connection.close()
+                self._open_connections -= 1
 
-    def cancel_job(self, job_id: int):
+            self._idle_connections = []
+
+
+class _IppPipelineReader:
+    """
+    reads the responses of a pipelined connection one after another
+
+    http.client closes the file of a response after it was read, which would drop the following responses
+    buffered by it. the responses get this reader as their socket and share one file which is only closed by close()
+    """
+
+    def __init__(self, sock):
+        self._file = sock.makefile('rb')
+
+    def makefile(self, mode, *args, **kwargs):
+        return _IppPipelineFile(self._file)
+
+    def close(self):
+        self._file.close()
+
+
+class _IppPipelineFile:
+    def __init__(self, file):
+        self._file = file
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def close(self):
+        pass
+
+
+class _IppCacheLoad:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.exception = None
+
+
+class IppAttributeCache:
+    """
+    time-bounded lru cache for printer attributes
+
+    entries are fresh for ttl seconds, afterwards they are returned for stale_ttl more seconds while a background
+    thread refreshes them. concurrent requests for the same missing entry wait for one shared request
+
+    the keys of the clients start with their server, so one cache can be shared by clients of several servers
+    """
+
+    def __init__(self, ttl=60.0, max_entries=256, stale_ttl=0.0):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._stale_ttl = stale_ttl
+
+        self._entries = collections.OrderedDict()
+        self._loads = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _load(self, key, loader, load: _IppCacheLoad, generation: int):
+        try:
+            load.value = loader()
+        except BaseException as e:
+            load.exception = e
+        else:
+            with self._lock:
+                # the entry was invalidated while it was loaded, the value may be outdated
+                if generation == self._generation:
+                    self._entries[key] = (time.monotonic(), load.value)
+                    self._entries.move_to_end(key)
+
+                    while len(self._entries) > self._max_entries:
+                        self._entries.popitem(last=False)
+        finally:
+            with self._lock:
+                self._loads.pop(key, None)
+
+            load.event.set()
+
+    def get(self, key, loader):
+        with self._lock:
+            entry = self._entries.get(key)
+            load = self._loads.get(key)
+
+            if entry is not None:
+                age = time.monotonic() - entry[0]
+
+                if age < self._ttl + self._stale_ttl:
+                    self._entries.move_to_end(key)
+
+                    # refresh a stale entry in the background
+                    if age >= self._ttl and load is None:
+                        load = self._loads[key] = _IppCacheLoad()
+                        threading.Thread(target=self._load, args=(key, loader, load, self._generation),
+                                         daemon=True).start()
+
+                    return copy.deepcopy(entry[1])
+
+                del self._entries[key]
+
+            owner = load is None
+            if owner:
+                load = self._loads[key] = _IppCacheLoad()
+
+            generation = self._generation
+
+        if owner:
+            self._load(key, loader, load, generation)
+        else:
+            load.event.wait()
+
+        if load.exception is not None:
+            raise load.exception
+
+        return copy.deepcopy(load.value)
+
+    def invalidate(self, printer=None, server=None):
+        # removes the entries of the printer and all listings, without printer all entries
+        # server restricts the removed entries to the ones of this server
+        with self._lock:
+            self._generation += 1
+
+            for key in list(self._entries):
+                if server is not None and key[0] != server:
+                    continue
+
+                if printer is None or key[1] is None or key[1] == printer:
+                    del self._entries[key]
+
+
+IppEvent = collections.namedtuple('IppEvent', ['subscription_id', 'sequence_number', 'event', 'printer', 'job_id',
+                                               'job_state', 'printer_state', 'text', 'attributes'])
+
+
+def _construct_event(attributes: dict):
+    printer = attributes.get('printer-name')
+
+    if printer is None and 'notify-printer-uri' in attributes:
+        printer = attributes['notify-printer-uri'].rsplit('/', 1)[-1]
+
+    return IppEvent(attributes.get('notify-subscription-id'), attributes.get('notify-sequence-number'),
+                    attributes.get('notify-subscribed-event'), printer, attributes.get('notify-job-id'),
+                    attributes.get('job-state'), attributes.get('printer-state'), attributes.get('notify-text'),
+                    attributes)
+
+
+def _construct_subscription(operation: IppOperation, user: str, printer=None, events=None, lease_duration=None,
+                            job_id=None):
+    subscription_attributes = {
+        'notify-pull-method': 'ippget',
+        'notify-events': events
+    }
+
+    if lease_duration is not None:
+        subscription_attributes['notify-lease-duration'] = lease_duration
+
+    if job_id is not None:
+        subscription_attributes['notify-job-id'] = job_id
+
+    return construct_request(operation, 1, {
+        'printer-uri': 'ipp://localhost/printers/{0}'.format(printer) if printer else 'ipp://localhost/',
+        'requesting-user-name': user
+    }, subscription_attributes=subscription_attributes)
+
+
+class _IppEventCursor:
+    """
+    state of an event stream shared by the sync and async clients
+
+    keeps the next expected sequence number of every subscription, so events are yielded once and a stream
+    created with the sequence numbers of a previous one continues without gaps
+    """
+
+    def __init__(self, subscription_ids, sequence_numbers=None, lease_duration=None, wait=True, poll_interval=None):
+        sequence_numbers = sequence_numbers or {}
+
+        self.sequence_numbers = {i: sequence_numbers.get(i, 1) for i in subscription_ids}
+        self.lease_duration = lease_duration
+        self.wait = wait
+        self.poll_interval = poll_interval
+        self.interval = poll_interval or IPP_NOTIFY_POLL_INTERVAL
+
+        now = time.monotonic()
+        self.renewals = {i: now + lease_duration / 2 for i in subscription_ids} if lease_duration else {}
+
+    def due_renewals(self):
+        now = time.monotonic()
+
+        return [i for i, renew_at in self.renewals.items() if renew_at <= now]
+
+    def renewed(self, subscription_id: int, renewable=True):
+        # job subscriptions end with their job and can't be renewed
+        if renewable:
+            self.renewals[subscription_id] = time.monotonic() + self.lease_duration / 2
+        else:
+            self.renewals.pop(subscription_id, None)
+
+    def construct_request(self, user: str):
+        subscription_ids = list(self.sequence_numbers)
+
+        return construct_request(IppOperation.GET_NOTIFICATIONS, 1, {
+            'printer-uri': 'ipp://localhost/',
+            'requesting-user-name': user,
+            'notify-subscription-ids': subscription_ids,
+            'notify-sequence-numbers': [self.sequence_numbers[i] for i in subscription_ids],
+            'notify-wait': self.wait
+        })
+
+    def process(self, response: dict):
+        interval = response['operation-attributes'].get('notify-get-interval')
+
+        if self.poll_interval is None and isinstance(interval, int):
+            self.interval = interval
+
+        events = []
+
+        for attributes in response['events']:
+            event = _construct_event(attributes)
+            expected = self.sequence_numbers.get(event.subscription_id)
+
+            if expected is None or event.sequence_number is None or event.sequence_number < expected:
+                continue
+
+            self.sequence_numbers[event.subscription_id] = event.sequence_number + 1
+            events.append(event)
+
+        return events
+
+
+class IppEventStream:
+    """
+    iterator over the events of subscriptions, long polling get notifications and renewing the leases
+
+    sequence_numbers can be stored and passed to a new stream to resume after a restart
+    """
+
+    def __init__(self, client, subscription_ids, sequence_numbers=None, lease_duration=IPP_SUBSCRIPTION_LEASE_DURATION,
+                 wait=True, poll_interval=None):
+        self._client = client
+        self._cursor = _IppEventCursor(subscription_ids, sequence_numbers, lease_duration, wait, poll_interval)
+        self._closed = threading.Event()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __iter__(self):
+        cursor = self._cursor
+
+        while not self._closed.is_set():
+            for subscription_id in cursor.due_renewals():
+                try:
+                    self._client.renew_subscription(subscription_id, cursor.lease_duration)
+                except IppException as e:
+                    if e.code != IppStatus.ERROR_NOT_POSSIBLE:
+                        raise
+
+                    cursor.renewed(subscription_id, False)
+                else:
+                    cursor.renewed(subscription_id)
+
+            response = self._client._request(self._client._construct_uri('', ''),
+                                             cursor.construct_request(self._client.user))
+            events = cursor.process(response)
+
+            for event in events:
+                yield event
+
+            if not events:
+                self._closed.wait(cursor.interval)
+
+    @property
+    def sequence_numbers(self):
+        return dict(self._cursor.sequence_numbers)
+
+    def close(self, cancel=False):
+        self._closed.set()
+
+        if cancel:
+            for subscription_id in self._cursor.sequence_numbers:
+                self._client.cancel_subscription(subscription_id)
+
+
+class IppBulkResult(collections.namedtuple('IppBulkResult', ['results', 'errors', 'elapsed'])):
+    """
+    results maps the positions of the targets of a bulk operation to the return values, errors to the raised
+    exceptions
+    """
+
+    __slots__ = ()
+
+    @property
+    def throughput(self):
+        # operations per second
+        return (len(self.results) + len(self.errors)) / self.elapsed if self.elapsed else 0.0
+
+
+class _IppJobWatch:
+    def __init__(self, job_id: int, printer, future: concurrent.futures.Future, deadline):
+        self.job_id = job_id
+        self.printer = printer
+        self.future = future
+        self.deadline = deadline
+        self.state = None
+        self.interval = 0
+        self.next_check = 0
+
+
+class IppJobWaiter:
+    """
+    waits for many jobs until they are completed, canceled or aborted
+
+    a background thread checks all due jobs of a printer with one get jobs request, which only requests
+    job-id and job-state. every job is checked again after min_interval seconds, the interval is multiplied by
+    backoff up to max_interval while the state of the job doesn't change
+    """
+
+    def __init__(self, client, min_interval=IPP_JOB_POLL_MIN_INTERVAL, max_interval=IPP_JOB_POLL_MAX_INTERVAL,
+                 backoff=2.0):
+        self._client = client
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._backoff = backoff
+
+        self._watches = []
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def wait_for_jobs(self, job_ids, timeout=None, printer=None, callback=None):
+        """
+        returns a dict of job id -> concurrent.futures.Future, the future resolves to the final IppJobState or
+        raises concurrent.futures.TimeoutError after timeout seconds. callback(job_id, future) is called when a
+        future is resolved
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        futures = {}
+
+        with self._condition:
+            for job_id in job_ids:
+                future = futures[job_id] = concurrent.futures.Future()
+                future.set_running_or_notify_cancel()
+
+                if callback:
+                    future.add_done_callback(lambda f, job_id=job_id: callback(job_id, f))
+
+                self._watches.append(_IppJobWatch(job_id, printer, future, deadline))
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='IppJobWaiter', daemon=True)
+                self._thread.start()
+
+            self._condition.notify()
+
+        return futures
+
+    def _run(self):
+        try:
+            self._poll()
+        finally:
+            # the next wait_for_jobs starts a new thread, also if this one was stopped by an error
+            with self._condition:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+
+    def _poll(self):
+        while True:
+            with self._condition:
+                while True:
+                    now = time.monotonic()
+                    self._expire(now)
+
+                    if not self._watches:
+                        self._thread = None
+                        return
+
+                    due = [w for w in self._watches if w.next_check <= now]
+                    if due:
+                        break
+
+                    wake_at = min(min(w.next_check, w.deadline or w.next_check) for w in self._watches)
+                    self._condition.wait(max(0.0, wake_at - now))
+
+            printers = {}
+            for watch in due:
+                printers.setdefault(watch.printer, []).append(watch)
+
+            for printer, watches in printers.items():
+                try:
+                    self._check(printer, watches)
+                except Exception as e:
+                    # an unexpected error fails the jobs of this check instead of stopping the waiter
+                    with self._condition:
+                        for watch in watches:
+                            if not watch.future.done():
+                                watch.future.set_exception(e)
+
+                        self._watches = [w for w in self._watches if not w.future.done()]
+
+    def _expire(self, now: float):
+        for watch in self._watches:
+            if watch.deadline is not None and watch.deadline <= now:
+                watch.future.set_exception(concurrent.futures.TimeoutError(
+                    'job {0} not finished in time'.format(watch.job_id)))
+
+        self._watches = [w for w in self._watches if not w.future.done()]
+
+    def _check(self, printer, watches: list):
+        try:
+            try:
+                jobs = self._client.get_jobs(printer, attributes=['job-state'], job_ids={w.job_id for w in watches})
+            except IppException as e:
+                if e.code != IppStatus.ERROR_NOT_FOUND:
+                    raise
+
+                # cups rejects the whole request if one of the jobs doesn't exist, the jobs are requested one by one
+                jobs = self._get_jobs_one_by_one(watches)
+        except _IPP_REQUEST_ERRORS:
+            # the jobs are checked again after the next interval and time out eventually
+            jobs = None
+
+        now = time.monotonic()
+
+        with self._condition:
+            for watch in watches:
+                job = jobs.get(watch.job_id) if jobs is not None else None
+
+                if jobs is not None and job is None:
+                    watch.future.set_exception(IppException('job {0} not found'.format(watch.job_id),
+                                                            IppStatus.ERROR_NOT_FOUND))
+                    continue
+
+                state = job.get('job-state') if job else None
+
+                if state in _IPP_TERMINAL_JOB_STATES:
+                    watch.future.set_result(state)
+                    continue
+
+                # progress resets the interval, an unchanged job is checked less often
+                if job is not None and state != watch.state:
+                    watch.interval = self._min_interval
+                else:
+                    watch.interval = min(max(watch.interval * self._backoff, self._min_interval), self._max_interval)
+
+                watch.state = state
+                watch.next_check = now + watch.interval
+
+            self._watches = [w for w in self._watches if not w.future.done()]
+
+    def _get_jobs_one_by_one(self, watches: list):
+        jobs = {}
+
+        for watch in watches:
+            try:
+                jobs[watch.job_id] = self._client.get_job_attributes(watch.job_id, ['job-id', 'job-state'])
+            except IppException as e:
+                if e.code != IppStatus.ERROR_NOT_FOUND:
+                    raise
+
+        return jobs
+
+
+class _IppScheduledOperation:
+    def __init__(self, function, args, kwargs, future: concurrent.futures.Future):
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+        self.attempts = 0
+        self.started = 0
+
+
+class IppSubmissionScheduler:
+    """
+    runs the operations of one client with adaptive concurrency and retries transient errors
+
+    an operation failing with a retryable status (e.g. server-error-busy) is repeated up to max_attempts times after
+    a random delay of up to base_delay * 2 ** retry seconds, at most max_delay. other errors are fatal and raised by
+    the future of the operation
+
+    the concurrency starts at max_concurrency. a retryable status halves it down to min_concurrency, every successful
+    operation adds 1 / concurrency, i.e. it grows by one per round of successful operations. the client should have
+    a connection pool of max_concurrency connections
+    """
+
+    def __init__(self, client, max_concurrency=IPP_SCHEDULER_MAX_CONCURRENCY, min_concurrency=1,
+                 max_attempts=IPP_RETRY_MAX_ATTEMPTS, base_delay=IPP_RETRY_BASE_DELAY, max_delay=IPP_RETRY_MAX_DELAY,
+                 retryable_statuses=IPP_RETRYABLE_STATUSES):
+        self._client = client
+        self._max_concurrency = max_concurrency
+        self._min_concurrency = min_concurrency
+        self._max_attempts = max_attempts
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._retryable_statuses = retryable_statuses
+
+        self._concurrency = float(max_concurrency)
+        self._decreased_at = 0.0
+        self._queue = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._counters = collections.Counter()
+        self._closed = False
+
+        self._condition = threading.Condition()
+        self._thread = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_concurrency)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def queue_depth(self):
+        # operations waiting to be started, including the ones waiting for a retry
+        return len(self._queue)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    @property
+    def concurrency(self):
+        return int(self._concurrency)
+
+    def stats(self):
+        with self._condition:
+            return {
+                'queued': len(self._queue),
+                'in-flight': self._in_flight,
+                'concurrency': int(self._concurrency),
+                'submitted': self._counters['submitted'],
+                'completed': self._counters['completed'],
+                'failed': self._counters['failed'],
+                'retried': self._counters['retried'],
+                'throttled': self._counters['throttled']
+            }
+
+    def is_retryable(self, exception):
+        return isinstance(exception, IppException) and exception.code in self._retryable_statuses
+
+    def submit(self, operation, *args, **kwargs):
+        """
+        queues operation(*args, **kwargs) and returns a concurrent.futures.Future of its result
+
+        operation is the name of a client method or a callable, e.g. scheduler.submit('print_file', 'office', path)
+        """
+        function = getattr(self._client, operation) if isinstance(operation, str) else operation
+        future = concurrent.futures.Future()
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('Scheduler is closed')
+
+            self._counters['submitted'] += 1
+            self._push(_IppScheduledOperation(function, args, kwargs, future), time.monotonic())
+
+        return future
+
+    def _push(self, operation: _IppScheduledOperation, not_before: float):
+        # queued operations are started in order, operations waiting for a retry when their delay has passed
+        heapq.heappush(self._queue, (not_before, next(self._sequence), operation))
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='IppSubmissionScheduler', daemon=True)
+            self._thread.start()
+
+        self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if not self._queue:
+                        # close() waits for the queue to become empty
+                        self._thread = None
+                        self._condition.notify_all()
+                        return
+
+                    now = time.monotonic()
+                    not_before, _, operation = self._queue[0]
+
+                    if self._in_flight >= int(self._concurrency):
+                        self._condition.wait()
+                    elif not_before > now:
+                        self._condition.wait(not_before - now)
+                    else:
+                        heapq.heappop(self._queue)
+                        break
+
+                # operations can be canceled until they are started for the first time
+                if not operation.attempts and not operation.future.set_running_or_notify_cancel():
+                    self._condition.notify_all()
+                    continue
+
+                operation.attempts += 1
+                operation.started = now
+                self._in_flight += 1
+
+            self._executor.submit(self._execute, operation)
+
+    def _execute(self, operation: _IppScheduledOperation):
+        try:
+            result = operation.function(*operation.args, **operation.kwargs)
+        except Exception as e:
+            self._failed(operation, e)
+        else:
+            with self._condition:
+                self._in_flight -= 1
+                self._concurrency = min(self._max_concurrency, self._concurrency + 1 / self._concurrency)
+                self._counters['completed'] += 1
+                self._condition.notify_all()
+
+            operation.future.set_result(result)
+
+    def _failed(self, operation: _IppScheduledOperation, exception: Exception):
+        retryable = self.is_retryable(exception)
+        retry = retryable and operation.attempts < self._max_attempts
+
+        with self._condition:
+            self._in_flight -= 1
+
+            # the operations started before the last decrease saw the same overload, it is halved once per round
+            if retryable and operation.started > self._decreased_at:
+                self._concurrency = max(self._min_concurrency, self._concurrency / 2)
+                self._decreased_at = time.monotonic()
+                self._counters['throttled'] += 1
+
+            if retry:
+                delay = random.uniform(0, min(self._max_delay, self._base_delay * 2 ** (operation.attempts - 1)))
+                self._counters['retried'] += 1
+                self._push(operation, time.monotonic() + delay)
+            else:
+                self._counters['failed'] += 1
+                self._condition.notify_all()
+
+        if not retry:
+            operation.future.set_exception(exception)
+
+    def close(self):
+        """
+        rejects new operations and waits until the queued operations are finished
+        """
+        with self._condition:
+            self._closed = True
+
+            while self._queue or self._in_flight:
+                self._condition.wait()
+
+        self._executor.shutdown()
+
+
+def _unix_socket_path(host: str):
+    # a host given as unix:///run/cups/cups.sock or as absolute path is a unix domain socket
+    if host.startswith('unix://'):
+        return host[len('unix://'):]
+
+    if host.startswith('/'):
+        return host
+
+    return None
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    http connection over a unix domain socket, e.g. the local socket of cupsd
+    """
+
+    def __init__(self, path: str, timeout=socket._GLOBAL_DEFAULT_TIMEOUT):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        try:
+            if self.timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                sock.settimeout(self.timeout)
+
+            sock.connect(self.socket_path)
+        except BaseException:
+            sock.close()
+            raise
+
+        self.sock = sock
+
+
+class IppTlsSessionCache:
+    """
+    thread-safe cache of the tls sessions of the last max_entries servers
+
+    connections created with the same cache resume the session of the previous connection to the server instead
+    of a full handshake, also across client instances. a session is only resumed with the ssl context it was created
+    with, so the sessions are kept per context. stats() returns the number and time of the handshakes
+    """
+
+    def __init__(self, max_entries=256):
+        self._max_entries = max_entries
+        self._sessions = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        self._handshakes = 0
+        self._resumed = 0
+        self._handshake_seconds = 0.0
+
+    def get(self, key):
+        with self._lock:
+            return self._sessions.get(key)
+
+    def put(self, key, session):
+        if session is None:
+            return
+
+        with self._lock:
+            self._sessions[key] = session
+            self._sessions.move_to_end(key)
+
+            while len(self._sessions) > self._max_entries:
+                self._sessions.popitem(last=False)
+
+    def record_handshake(self, resumed: bool, seconds: float):
+        with self._lock:
+            self._handshakes += 1
+            self._resumed += 1 if resumed else 0
+            self._handshake_seconds += seconds
+
+    def stats(self):
+        with self._lock:
+            return {
+                'handshakes': self._handshakes,
+                'resumed': self._resumed,
+                'handshake-seconds': self._handshake_seconds,
+                'sessions': len(self._sessions)
+            }
+
+
+# shared by all clients which don't get their own ssl context or session cache
+_IPP_SSL_CONTEXTS = {}
+_IPP_TLS_SESSION_CACHE = IppTlsSessionCache()
+
+
+def create_ssl_context(verify_certificate=True):
+    """
+    returns the ssl context which is shared by all clients with this verify_certificate setting
+    """
+    context = _IPP_SSL_CONTEXTS.get(verify_certificate)
+
+    if context is None:
+        context = ssl.create_default_context() if verify_certificate else ssl._create_unverified_context()
+        context = _IPP_SSL_CONTEXTS.setdefault(verify_certificate, context)
+
+    return context
+
+
+class _IppHTTPSConnection(http.client.HTTPSConnection):
+    """
+    https connection which resumes the tls session of the previous connection to the same server
+    """
+
+    def __init__(self, host: str, port: int, context: ssl.SSLContext, session_cache: IppTlsSessionCache):
+        super().__init__(host, port=port, context=context)
+        self._ipp_context = context
+        self._session_cache = session_cache
+        # sessions can't be resumed with another context (e.g. of a client without certificate verification)
+        self._session_key = (context, host, port)
+
+    def connect(self):
+        http.client.HTTPConnection.connect(self)
+
+        started = time.perf_counter()
+        self.sock = self._ipp_context.wrap_socket(self.sock, server_hostname=self.host,
+                                                  session=self._session_cache.get(self._session_key))
+
+        self._session_cache.record_handshake(self.sock.session_reused, time.perf_counter() - started)
+        self._session_cache.put(self._session_key, self.sock.session)
+
+    def getresponse(self):
+        response = super().getresponse()
+
+        # tls 1.3 sends the session tickets after the handshake, they are read together with the first response
+        if self.sock is not None and not self.sock.session_reused:
+            self._session_cache.put(self._session_key, self.sock.session)
+
+        return response
+
+
+class IppClient:
+    def __init__(self, host, port=631, user=None, password=None, use_ssl=True, verify_certificate=True, pool_size=1,
+                 connection_pool=None, attribute_cache=None, records=False, ssl_context=None,
+                 tls_session_cache=None):
+        """
+        connection_pool is an optional callable which creates the pool from a connection factory,
+        e.g. functools.partial(IppConnectionPool, size=8, idle_timeout=5)
+
+        attribute_cache is an optional IppAttributeCache for get_printer_attributes and get_printers,
+        it is invalidated by the operations which modify printers
+
+        records=True returns jobs, printers and the other attribute groups as read-only IppRecords
+
+        host can be the path of a unix domain socket, e.g. '/run/cups/cups.sock' or 'unix:///run/cups/cups.sock',
+        port and use_ssl are ignored then
+
+        ssl_context replaces the context shared by all clients (see create_ssl_context), tls_session_cache the
+        IppTlsSessionCache shared by all clients
+        """
+
+        self.__host = host
+        self.__port = port
+        self.__user = user if user else getpass.getuser()
+        self.__socket_path = _unix_socket_path(host)
+        self.__use_ssl = use_ssl and not self.__socket_path
+        self.__ssl_context = ssl_context or (create_ssl_context(verify_certificate) if self.__use_ssl else None)
+        self.__tls_session_cache = tls_session_cache or _IPP_TLS_SESSION_CACHE
+        self.__authority = 'localhost' if self.__socket_path else '{0}:{1}'.format(host, port)
+        self.__base_uri = 'http://{0}'.format(self.__authority)
+        # identifies the server in the keys of a shared attribute cache
+        self.__server = self.__socket_path or self.__authority
+
+        self._request_ids = itertools.count()
+        self._last_upload = None
+        self._printer_capabilities = {}
+        self._records = records
+        self._attribute_cache = attribute_cache
+        self._job_waiter = None
+
+        if connection_pool:
+            self._pool = connection_pool(self._create_connection)
+        else:
+            self._pool = IppConnectionPool(self._create_connection, pool_size)
+
+        self.__headers = {
+            'Content-Type': 'application/ipp'
+        }
+
+        if user and password:
+            self.__headers['Authorization'] = "Basic {0}".format(
+                base64.b64encode('{0}:{1}'.format(user, password).encode('utf-8')).decode('utf-8'))
+
+    def __del__(self):
+        self._pool.close()
+
+    @property
+    def host(self):
+        return self.__host
+
+    @property
+    def port(self):
+        return self.__port
+
+    @property
+    def user(self):
+        return self.__user
+
+    @user.setter
+    def user(self, user):
+        self.__user = user
+
+    @property
+    def tls_stats(self):
+        # handshakes, resumed handshakes and handshake time of all clients sharing the tls session cache
+        return self.__tls_session_cache.stats()
+
+    @property
+    def last_upload(self):
+        # method, size, duration and throughput of the last document sent by print_file
+        return self._last_upload
+
+    def _create_connection(self):
+        if self.__socket_path:
+            return _UnixHTTPConnection(self.__socket_path)
+
+        if self.__use_ssl:
+            return _IppHTTPSConnection(self.__host, self.__port, self.__ssl_context, self.__tls_session_cache)
+
+        return http.client.HTTPConnection(self.__host, port=self.__port)
+
+    @staticmethod
+    def _connect(connection):
+        # connections are established on their first use, connection errors are raised as transport errors
+        if connection.sock is None:
+            try:
+                connection.connect()
+            except OSError as e:
+                raise IppTransportException('Could not connect to IPP Server: {0}'.format(e))
+
+    def _construct_headers(self, data, expect_continue=False, chunked=False):
+        headers = copy.deepcopy(self.__headers)
+        if chunked:
+            headers['Transfer-Encoding'] = 'chunked'
+        else:
+            headers['Content-Length'] = len(data)
+        if expect_continue:
+            headers['Expect'] = '100-continue'
+
+        return headers
+
+    def _construct_uri(self, namespace: str, ipp_object: str):
+        return "{0}/{1}/{2}".format(self.__base_uri, namespace, ipp_object)
+
+    def _construct_request_head(self, uri: str, data: bytes):
+        # pipelined requests are written to the socket directly, http.client only sends one request at a time
+        head = ['POST {0} HTTP/1.1'.format(uri), 'Host: {0}'.format(self.__authority)]
+        head.extend('{0}: {1}'.format(name, value) for name, value in self._construct_headers(data).items())
+
+        return ('\r\n'.join(head) + '\r\n\r\n').encode('latin-1')
+
+    def _get_response_data(self, connection):
+        response = connection.getresponse()
+        if response.getcode() == 200:
+            return response.read()
+        else:
+            raise IppTransportException('Error: {0}'.format(response.getcode()))
+
+    def _read_response(self, connection, data: bytes):
+        # reads the response to the request data from the connection
+        response = parse_response_without_check(self._get_response_data(connection), records=self._records)
+
+        _check_request_id(data, response['request-id'])
+        _check_response_for_errors(response)
+
+        return response
+
+    def _post(self, uri: str, data: bytes):
+        # sends the request on a pooled connection and returns the connection and the response
+        # idempotent operations are repeated once on a new connection if a kept-alive connection went stale
+        retries = 1 if _STRUCT_SHORT.unpack_from(data, 2)[0] in _IPP_IDEMPOTENT_OPERATIONS else 0
+
+        while True:
+            connection = self._pool.acquire()
+
+            try:
+                self._connect(connection)
+                connection.request('POST', uri, headers=self._construct_headers(data), body=data)
+                response = connection.getresponse()
+            except _IPP_STALE_CONNECTION_ERRORS:
+                self._pool.release(connection, False)
+
+                if not retries:
+                    raise
+
+                retries -= 1
+                continue
+            except BaseException:
+                self._pool.release(connection, False)
+                raise
+
+            if response.getcode() != 200:
+                self._pool.release(connection, False)
+                raise IppTransportException('Error: {0}'.format(response.getcode()))
+
+            return connection, response
+
+    def _request(self, uri: str, data: bytes, contains_data=False, assign_request_id=True):
+        if assign_request_id:
+            data = _assign_request_id(data, self._request_ids)
+
+        connection, response = self._post(uri, data)
+
+        try:
+            response_data = parse_response_without_check(response.read(), contains_data, self._records)
+            _check_request_id(data, response_data['request-id'])
+        except BaseException:
+            self._pool.release(connection, False)
+            raise
+
+        self._pool.release(connection)
+
+        _check_response_for_errors(response_data)
+
+        return response_data
+
+    def _stream_response(self, uri: str, data: bytes, group_key: str):
+        # yields the attribute groups with the given key while the response is read from the connection
+        data = _assign_request_id(data, self._request_ids)
+        connection, response = self._post(uri, data)
+
+        decoder = IppResponseDecoder(self._records)
+        completed = False
+
+        try:
+            while not decoder.finished:
+                chunk = response.read(IPP_RESPONSE_CHUNK_SIZE)
+                if not chunk:
+                    raise IppTransportException('Incomplete IPP response')
+
+                for key, attributes in decoder.feed(chunk):
+                    if key == 'operation-attributes':
+                        _check_request_id(data, decoder.request_id)
+                        _check_response_for_errors({'status-code': decoder.status_code,
+                                                    'operation-attributes': attributes})
+                    elif key == group_key:
+                        yield attributes
+
+            response.read()
+            completed = True
+        finally:
+            # the response wasn't read completely, the connection can't be reused
+            self._pool.release(connection, completed)
+
+    def _send_document(self, connection, document, size: int):
+        # plaintext sockets send the file with sendfile, the kernel copies it directly to the socket
+        # tls sockets have to encrypt in userspace, they get large blocks of the memory-mapped file
+        started = time.monotonic()
+        sock = connection.sock
+
+        if not size:
+            method = None
+        elif not isinstance(sock, ssl.SSLSocket) and hasattr(sock, 'sendfile'):
+            method = 'sendfile'
+            sock.sendfile(document, 0, size)
+        else:
+            method = 'mmap'
+            with mmap.mmap(document.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+
+                try:
+                    for offset in range(0, size, IPP_UPLOAD_BLOCK_SIZE):
+                        sock.sendall(view[offset:offset + IPP_UPLOAD_BLOCK_SIZE])
+                finally:
+                    view.release()
+
+        seconds = time.monotonic() - started
+
+        self._last_upload = {
+            'method': method,
+            'bytes': size,
+            'seconds': seconds,
+            'bytes-per-second': size / seconds if seconds else 0.0
+        }
+
+    def send_request(self, uri: str, operation: IppOperation, request_id: int, operation_attributes=None,
+                     job_attributes=None, printer_attributes=None):
+
+        data = construct_request(operation, request_id, operation_attributes, job_attributes, printer_attributes)
+
+        return self._request("{0}/{1}".format(self.__base_uri, uri), data, assign_request_id=False)
+
+    def send_raw_request(self, uri: str, raw_request: bytes):
+        return self._request("{0}/{1}".format(self.__base_uri, uri), raw_request, assign_request_id=False)
+
+    def _send_pipelined(self, connection, requests, depth: int):
+        # writes the requests back-to-back and reads the responses in the same order
+        # returns the responses read until the server closed the connection, the others have to be sent again
+        self._connect(connection)
+
+        reader = _IppPipelineReader(connection.sock)
+        responses = []
+        sent = 0
+
+        try:
+            while len(responses) < len(requests):
+                while sent < len(requests) and sent - len(responses) < depth:
+                    uri, data = requests[sent]
+                    connection.sock.sendall(self._construct_request_head(uri, data) + data)
+                    sent += 1
+
+                response = http.client.HTTPResponse(reader, method='POST')
+                response.begin()
+                body = response.read()
+
+                if response.status != 200:
+                    raise IppTransportException('Error: {0}'.format(response.status))
+
+                response_data = parse_response_without_check(body, records=self._records)
+                _check_request_id(requests[len(responses)][1], response_data['request-id'])
+
+                try:
+                    _check_response_for_errors(response_data)
+                except IppException as e:
+                    response_data = e
+
+                responses.append(response_data)
+
+                if response.will_close:
+                    connection.close()
+                    break
+        except (OSError, http.client.HTTPException):
+            connection.close()
+        finally:
+            reader.close()
+
+        return responses
+
+    def pipeline(self, requests, depth=IPP_PIPELINE_DEPTH):
+        """
+        sends independent requests back-to-back on one keep-alive connection (http/1.1 pipelining) and returns
+        their responses in the same order, without waiting a round trip for every response
+
+        requests is an iterable of (uri, raw_request) tuples as for send_raw_request, every request gets a new
+        request id. at most depth requests are sent ahead of their responses
+
+        only idempotent operations can be pipelined, they are sent again on a new connection if the server closes the
+        connection in between. ipp errors are returned in place of their responses, transport errors are raised
+        """
+
+        requests = [("{0}/{1}".format(self.__base_uri, uri), _assign_request_id(data, self._request_ids))
+                    for uri, data in requests]
+
+        for _, data in requests:
+            if _STRUCT_SHORT.unpack_from(data, 2)[0] not in _IPP_IDEMPOTENT_OPERATIONS:
+                raise ValueError('Only idempotent operations can be pipelined')
+
+        responses = []
+        # a connection which is closed before any response arrived (e.g. a stale kept-alive one) is replaced once
+        retries = 1
+
+        with self._pool.connection() as connection:
+            while len(responses) < len(requests):
+                received = self._send_pipelined(connection, requests[len(responses):], depth)
+
+                if received:
+                    retries = 1
+                elif retries:
+                    retries -= 1
+                else:
+                    raise IppTransportException('Connection closed by IPP Server')
+
+                responses.extend(received)
+
+        return responses
+
+    def _create_job(self, printer: str, job_name: str, copies=1, priority=50):
+        data = construct_request(IppOperation.CREATE_JOB, 1, operation_attributes={
+            'printer-uri': 'ipp://localhost/printers/{0}'.format(printer),
+            'requesting-user-name': self.__user,
+            'job-name': job_name
+        }, job_attributes={
+            'copies': copies,
+            'job-priority': priority
+        })
+
+        response_data = self._request(self._construct_uri('printers', printer), data)
+
+        return response_data['jobs'][0]['job-id']
+
+    def _construct_send_document(self, printer: str, job_id: int, document_name: str, document_format: str,
+                                 compression=None):
+        operation_attributes = {
+            'printer-uri': 'ipp://localhost/printers/{0}'.format(printer),
+            'requesting-user-name': self.__user,
+            'job-id': job_id,
+            'document-name': document_name,
+            'document-format': document_format,
+            'last-document': True
+        }
+
+        if compression:
+            operation_attributes['compression'] = compression
+
+        return construct_request(IppOperation.SEND_DOCUMENT, 2, operation_attributes=operation_attributes)
+
+    def _construct_print_job(self, printer: str, job_name: str, document_format: str, copies=1, priority=50,
+                             compression=None):
+        operation_attributes = {
+            'printer-uri': 'ipp://localhost/printers/{0}'.format(printer),
+            'requesting-user-name': self.__user,
+            'job-name': job_name,
+            'document-format': document_format
+        }
+
+        if compression:
+            operation_attributes['compression'] = compression
+
+        return construct_request(IppOperation.PRINT_JOB, 1, operation_attributes=operation_attributes,
+                                 job_attributes={
+                                     'copies': copies,
+                                     'job-priority': priority
+                                 })
+
+    def _get_printer_capabilities(self, printer: str):
+        # the supported values of a printer are fetched once per client
+        # without them the job is sent without print-job and compression, as before the lookup existed
+        capabilities = self._printer_capabilities.get(printer)
+
+        if capabilities is None:
+            try:
+                capabilities = self.get_printer_attributes(printer, IPP_CAPABILITY_ATTRIBUTES)
+            except _IPP_REQUEST_ERRORS:
+                return {}
+
+            self._printer_capabilities[printer] = capabilities
+
+        return capabilities
+
+    def _use_print_job(self, printer: str, use_print_job=None):
+        # single document jobs are sent with one print-job request if the printer supports it,
+        # create-job + send-document needs two round trips
+        if use_print_job is not None:
+            return use_print_job
+
+        supported = self._get_printer_capabilities(printer).get('operations-supported', [])
+        if not isinstance(supported, list):
+            supported = [supported]
+
+        return IppOperation.PRINT_JOB in supported
+
+    def _negotiate_compression(self, printer: str, compression):
+        # falls back to an uncompressed upload if the printer doesn't support the requested compression
+        if not compression or compression == 'none':
+            return None
+
+        supported = self._get_printer_capabilities(printer).get('compression-supported', [])
+        if not isinstance(supported, list):
+            supported = [supported]
+
+        return compression if compression in supported else None
+
+    @staticmethod
+    def _put_request(connection, uri: str, headers: dict):
+        connection.putrequest('POST', uri)
+        for header_name, header_value in headers.items():
+            connection.putheader(header_name, header_value)
+        connection.endheaders()
+
+    @staticmethod
+    def _wait_for_continue(connection):
+        # waits for the interim 100 response before the document is uploaded
+        # a final response means the server rejected the request (e.g. authentication) before the body was sent
+        # without any response within the timeout the body is sent anyway (rfc 7231 5.1.1)
+        sock = connection.sock
+        timeout = sock.gettimeout()
+        deadline = time.monotonic() + IPP_EXPECT_CONTINUE_TIMEOUT
+
+        # read the status line and headers byte by byte, nothing of a following response may be consumed
+        # the socket can't be polled with select, tls 1.3 session tickets make a fresh tls socket readable without
+        # any response. the first byte is read with the remaining timeout, the rest of the response as usual
+        head = bytearray()
+        try:
+            while not head.endswith(b'\r\n\r\n'):
+                if not head:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return
+
+                    sock.settimeout(remaining)
+
+                try:
+                    byte = sock.recv(1)
+                except socket.timeout:
+                    if head:
+                        raise IppTransportException('Incomplete HTTP response')
+
+                    return
+
+                if not byte:
+                    raise IppTransportException('Connection closed by IPP Server')
+
+                if not head:
+                    sock.settimeout(timeout)
+
+                head += byte
+        finally:
+            sock.settimeout(timeout)
+
+        status = int(head.split(None, 2)[1])
+        if status != 100:
+            raise IppTransportException('Error: {0}'.format(status))
+
+    def _send_document_chunked(self, printer: str, data: bytes, blocks):
+        data = _assign_request_id(data, self._request_ids)
+
+        with self._pool.connection() as connection:
+            self._connect(connection)
+            self._put_request(connection, self._construct_uri('printers', printer),
+                              self._construct_headers(data, True, chunked=True))
+            self._wait_for_continue(connection)
+
+            for block in itertools.chain((data,), blocks):
+                # an empty chunk would end the body
+                if block:
+                    connection.send('{0:x}\r\n'.format(len(block)).encode('ascii'))
+                    connection.send(block)
+                    connection.send(b'\r\n')
+
+            connection.send(b'0\r\n\r\n')
+
+            return self._read_response(connection, data)
+
+    def print_file(self, printer: str, file_path: str, job_name=None, copies=1, priority=50, compression=None,
+                   use_print_job=None):
+        """
+        compression: 'gzip' or 'deflate' compresses the document while it is sent, if the printer supports it
+        use_print_job: submit the job with a single print-job request instead of create-job + send-document,
+        by default it is used if the printer supports it
+        """
+
+        if not os.path.exists(file_path):
+            return None
+
+        if not job_name:
+            job_name = os.path.basename(file_path)
+
+        compression = self._negotiate_compression(printer, compression)
+
+        if self._use_print_job(printer, use_print_job):
+            job_id = None
+
+            data = self._construct_print_job(printer, job_name, 'application/octet-stream', copies, priority,
+                                             compression)
+        else:
+            # construct request body part 1
+            # create job
+            job_id = self._create_job(printer, job_name, copies, priority)
+
+            # construct request body part 2
+            # create document
+            data = self._construct_send_document(printer, job_id, job_name, 'application/octet-stream', compression)
+
+        try:
+            # the size of a compressed document isn't known before it is sent
+            if compression:
+                with open(file_path, 'rb') as doc_obj:
+                    response_data = self._send_document_chunked(
+                        printer, data, _compress_document_blocks(_iter_document_blocks(doc_obj), compression))
+            else:
+                data = _assign_request_id(data, self._request_ids)
+                header = self._construct_headers(data, True)
+                header['Content-Length'] += os.path.getsize(file_path)
+
+                # send custom request
+                # send file in chunks
+                with self._pool.connection() as connection:
+                    self._connect(connection)
+                    self._put_request(connection, self._construct_uri('printers', printer), header)
+                    self._wait_for_continue(connection)
+
+                    connection.send(data)
+                    with open(file_path, 'rb') as doc_obj:
+                        self._send_document(connection, doc_obj, header['Content-Length'] - len(data))
+
+                    response_data = self._read_response(connection, data)
+        except BaseException:
+            if job_id is not None:
+                self._cancel_created_job(job_id)
+            raise
+
+        return job_id if job_id is not None else response_data['jobs'][0]['job-id']
+
+    def print_stream(self, printer: str, document, job_name='Untitled', copies=1, priority=50,
+                     document_format='application/octet-stream', compression=None, use_print_job=None):
+        """
+        prints bytes, a file-like object or an iterable of byte blocks (e.g. a generator rendering the document)
+
+        the size doesn't have to be known, the document is sent with chunked transfer encoding while it is produced
+        """
+
+        compression = self._negotiate_compression(printer, compression)
+
+        blocks = _iter_document_blocks(document)
+        if compression:
+            blocks = _compress_document_blocks(blocks, compression)
+
+        if self._use_print_job(printer, use_print_job):
+            data = self._construct_print_job(printer, job_name, document_format, copies, priority, compression)
+
+            return self._send_document_chunked(printer, data, blocks)['jobs'][0]['job-id']
+
+        job_id = self._create_job(printer, job_name, copies, priority)
+
+        data = self._construct_send_document(printer, job_id, job_name, document_format, compression)
+
+        try:
+            self._send_document_chunked(printer, data, blocks)
+        except BaseException:
+            self._cancel_created_job(job_id)
+            raise
+
+        return job_id
+
+    def _cancel_created_job(self, job_id: int):
+        # a job without its document is useless, e.g. a cluster sends the document to another printer instead
+        try:
+            self.cancel_job(job_id)
+        except _IPP_REQUEST_ERRORS:
+            pass
+
+    def _cached(self, printer, kind: str, attributes, loader):
+        if self._attribute_cache is None:
+            return loader()
+
+        return self._attribute_cache.get((self.__server, printer, kind, tuple(attributes) if attributes else None),
+                                         loader)
+
+    def _invalidate_printer(self, printer: str):
+        self._printer_capabilities.pop(printer, None)
+
+        if self._attribute_cache is not None:
+            self._attribute_cache.invalidate(printer, self.__server)
+
+    def get_printer_attributes(self, printer: str, attributes=None):
+        return self._cached(printer, 'printer-attributes', attributes,
+                            lambda: self._get_printer_attributes(printer, attributes))
+
+    def _get_printer_attributes(self, printer: str, attributes=None):
+        printer_uri = 'ipp://localhost/printers/{0}'.format(printer)
+
+        # construct request body part 1
+        # create job
+
+        data = construct_request(IppOperation.GET_PRINTER_ATTRIBUTES, 1, {
+            'printer-uri': printer_uri,
+            'requesting-user-name': self.__user,
+            'requested-attributes': attributes if attributes else IPP_DEFAULT_PRINTER_ATTRIBUTES
+        })
+
+        response_data = self._request(self._construct_uri('printers', printer), data)
+
+        return response_data['printers'][0]
+
+    def resume_printer(self, printer: str):
+        printer_uri = 'ipp://localhost/printers/{0}'.format(printer)
+
+        data = construct_request(IppOperation.RESUME_PRINTER, 1, {
+            'printer-uri': printer_uri
+        })
+
+        self._request(self._construct_uri('admin', ''), data)
+
+        self._invalidate_printer(printer)
+
+        return True
+
+    def pause_printer(self, printer: str):
+        printer_uri = 'ipp://localhost/printers/{0}'.format(printer)
+
+        data = construct_request(IppOperation.PAUSE_PRINTER, 1, {
+            'printer-uri': printer_uri
+        })
+
+        self._request(self._construct_uri('admin', ''), data)
+
+        self._invalidate_printer(printer)
+
+        return True
+
+    def get_jobs(self, printer=None, which_jobs='not-completed', my_jobs=False, attributes=None, job_ids=None):
+        return {j['job-id']: j for j in self.stream_jobs(printer, which_jobs, my_jobs, attributes, job_ids)}
+
+    def stream_jobs(self, printer=None, which_jobs='not-completed', my_jobs=False, attributes=None, job_ids=None):
+        """
+        job_ids restricts the result to these jobs in any state, which_jobs is ignored then
+
+        the jobs are decoded while the response is read, the generator holds a pooled connection until it is
+        exhausted or closed. other requests of the client wait for a free connection meanwhile, with a pool of one
+        connection they fail after the acquire timeout of the pool. iter_jobs can be used for such loops
+        """
+        operation_attributes = {
+            'printer-uri': 'ipp://localhost/printers/{0}'.format(printer if printer else ''),
+            'which-jobs': which_jobs,
+            'my-jobs': my_jobs,
+            'requested-attributes': attributes + ['job-id'] if attributes else IPP_DEFAULT_JOB_ATTRIBUTES
+        }
+
+        # cups rejects which-jobs together with job-ids
+        if job_ids:
+            del operation_attributes['which-jobs']
+            operation_attributes['job-ids'] = list(job_ids)
+
+        data = construct_request(IppOperation.GET_JOBS, 1, operation_attributes)
+
+        return self._stream_response(self._construct_uri('', ''), data, 'jobs')
+
+    def iter_jobs(self, printer=None, which_jobs='all', user=None, attributes=None, job_ids=None,
+                  page_size=IPP_JOB_PAGE_SIZE, paging=None):
+        """
+        yields the jobs page by page, every page is a get jobs request for at most page_size jobs
+
+        which_jobs also takes the job state keywords of ipp 2.0, e.g. 'aborted', 'canceled' or 'processing',
+        user restricts the jobs to the jobs of this user, also together with job_ids. pages start at first-job-id, which isn't affected by
+        jobs added meanwhile, or at first-index for servers without first-job-id. by default active jobs are paged
+        by first-index, cups sorts them by priority, so pages by job id would skip jobs. jobs which complete
+        while they are paged by first-index can shift other jobs to an earlier page, which are skipped then
+
+        limit, first-job-id and first-index are optional, pages of servers which ignore them are cut to page_size
+        and the jobs which were already yielded are skipped
+
+        unlike stream_jobs the connection is released before the jobs of a page are yielded, so the client can be
+        used while the jobs are iterated
+        """
+        if paging is None:
+            paging = 'first-index' if which_jobs in _IPP_ACTIVE_WHICH_JOBS else 'first-job-id'
+
+        if paging not in ('first-job-id', 'first-index'):
+            raise ValueError('Unknown paging attribute {0}'.format(paging))
+
+        operation_attributes = {
+            'printer-uri': 'ipp://localhost/printers/{0}'.format(printer if printer else ''),
+            'which-jobs': which_jobs,
+            'limit': page_size,
+            'requested-attributes': attributes + ['job-id'] if attributes else IPP_DEFAULT_JOB_ATTRIBUTES
+        }
+
+        if user:
+            operation_attributes['requesting-user-name'] = user
+            operation_attributes['my-jobs'] = True
+
+        if job_ids:
+            # job-ids can't be combined with limit and which-jobs (cups), so the ids are split into pages
+            del operation_attributes['which-jobs']
+            del operation_attributes['limit']
+
+            job_ids = list(job_ids)
+
+            for i in range(0, len(job_ids), page_size):
+                operation_attributes['job-ids'] = job_ids[i:i + page_size]
+
+                data = construct_request(IppOperation.GET_JOBS, 1, operation_attributes)
+
+                # the page is read completely first, so the connection is free while the jobs are processed
+                yield from list(self._stream_response(self._construct_uri('', ''), data, 'jobs'))
+
+            return
+
+        next_page = 1
+        # first-index pages aren't ordered by job id, the ids of their jobs are kept to skip repeated jobs
+        seen = set()
+
+        while True:
+            operation_attributes[paging] = next_page
+
+            data = construct_request(IppOperation.GET_JOBS, 1, operation_attributes)
+
+            count = 0
+            new = 0
+            first_job_id = next_page
+            # the page is read completely first, so the connection is free while the jobs are processed,
+            # e.g. for a get_job_attributes per job with a pool of one connection
+            for job in list(self._stream_response(self._construct_uri('', ''), data, 'jobs')):
+                count += 1
+
+                # the rest of a page beyond the limit is read, but dropped
+                if new >= page_size:
+                    continue
+
+                job_id = job['job-id']
+                if paging == 'first-job-id':
+                    if job_id < first_job_id:
+                        continue
+
+                    next_page = max(next_page, job_id + 1)
+                elif job_id in seen:
+                    continue
+                else:
+                    seen.add(job_id)
+
+                new += 1
+                yield job
+
+            # a page without new jobs means the server ignored the paging attributes and the jobs are complete
+            if count < page_size or not new:
+                return
+
+            if paging == 'first-index':
+                next_page += min(count, page_size)
+
+    def run_bulk(self, operation, targets, workers=None, progress=None):
+        """
+        runs operation for every target with up to workers threads, by default one per pooled connection
+
+        operation is the name of a client method or a callable, a target is its argument or a tuple of arguments,
+        e.g. client.run_bulk('move_job', [(job_id, 'backup') for job_id in job_ids]). a failing target doesn't
+        stop the others, progress(done, total, elapsed) is called after every finished target.
+        returns an IppBulkResult, its results and errors are keyed by the position of the target in targets
+
+        every request needs a pooled connection, workers beyond the pool size wait for one. the default pool of
+        one connection runs the targets one after another, a client for bulk operations needs a larger pool_size
+        """
+        function = getattr(self, operation) if isinstance(operation, str) else operation
+        targets = list(targets)
+
+        results = {}
+        errors = {}
+        started = time.monotonic()
+
+        with concurrent.futures.ThreadPoolExecutor(workers or self._pool.size) as executor:
+            # targets can repeat or be unhashable, e.g. dicts of job options
+            futures = {executor.submit(function, *(t if isinstance(t, tuple) else (t,))): i
+                       for i, t in enumerate(targets)}
+
+            for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                index = futures[future]
+
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    errors[index] = e
+
+                if progress:
+                    progress(done, len(targets), time.monotonic() - started)
+
+        return IppBulkResult(dict(sorted(results.items())), dict(sorted(errors.items())), time.monotonic() - started)
+
+    def get_job_table(self, printer=None, which_jobs='completed', user=None, page_size=IPP_JOB_PAGE_SIZE):
+        """
+        returns the jobs as IppJobTable, only the attributes of the table are requested
+        """
+        attributes = IPP_JOB_TABLE_COLUMNS + ['job-originating-user-name', 'job-printer-uri']
+
+        return IppJobTable.from_jobs(self.iter_jobs(printer, which_jobs, user, attributes, page_size=page_size))
+
+    def wait_for_jobs(self, job_ids, timeout=None, printer=None, callback=None):
+        """
+        see IppJobWaiter.wait_for_jobs
+        """
+        if self._job_waiter is None:
+            self._job_waiter = IppJobWaiter(self)
+
+        return self._job_waiter.wait_for_jobs(job_ids, timeout, printer, callback)
+
+    def get_job_attributes(self, job_id: int, attributes=None):
+        data = construct_request(IppOperation.GET_JOB_ATTRIBUTES, 1, {
+            'job-uri': 'ipp://localhost/jobs/{0}'.format(job_id),
+            'requested-attributes': attributes if attributes else IPP_DEFAULT_JOB_ATTRIBUTES
+        })
+
+        response_data = self._request(self._construct_uri('', ''), data)
+
+        return response_data['jobs'][0]
+
+    def get_job_attributes_batch(self, job_ids, attributes=None):
+        """
+        returns the attributes of many jobs by job id, the requests are pipelined on one connection
+        jobs which can't be read (e.g. they don't exist anymore) map to their IppException
+        """
+
+        job_ids = list(job_ids)
+        responses = self.pipeline(('', construct_request(IppOperation.GET_JOB_ATTRIBUTES, 1, {
+            'job-uri': 'ipp://localhost/jobs/{0}'.format(job_id),
+            'requested-attributes': attributes if attributes else IPP_DEFAULT_JOB_ATTRIBUTES
+        })) for job_id in job_ids)
+
+        return {job_id: response if isinstance(response, IppException) else response['jobs'][0]
+                for job_id, response in zip(job_ids, responses)}
+
+    def cancel_job(self, job_id: int):
         data = construct_request(IppOperation.CANCEL_JOB, 1, {
             'job-uri': 'ipp://localhost/jobs/{0}'.format(job_id),
             'requesting-user-name': self.__user
         })
 
-        self._connection.request('POST', self._construct_uri('jobs', ''),
-                                 headers=self._construct_headers(data), body=data)
-        parse_response(self._get_response_data())
+        self._request(self._construct_uri('jobs', ''), data)
 
         return True
 
@@ -807,9 +2812,7 @@ class IppClient:
             'purge-jobs': True
         })
 
-        self._connection.request('POST', self._construct_uri('admin', ''),
-                                 headers=self._construct_headers(data), body=data)
-        parse_response(self._get_response_data())
+        self._request(self._construct_uri('admin', ''), data)
 
         return True
 
@@ -819,9 +2822,7 @@ class IppClient:
             'requesting-user-name': self.__user
         })
 
-        self._connection.request('POST', self._construct_uri('jobs', ''),
-                                 headers=self._construct_headers(data), body=data)
-        parse_response(self._get_response_data())
+        self._request(self._construct_uri('jobs', ''), data)
 
         return True
 
@@ -835,13 +2836,77 @@ class IppClient:
             'job-hold-until': hold_until
         })
 
-        self._connection.request('POST', self._construct_uri('jobs', ''),
-                                 headers=self._construct_headers(data), body=data)
-        parse_response(self._get_response_data())
+        self._request(self._construct_uri('jobs', ''), data)
+
+        return True
+
+    def create_printer_subscription(self, printer=None, events=None, lease_duration=IPP_SUBSCRIPTION_LEASE_DURATION):
+        """
+        subscribes to the events of the printer or of all printers, returns the notify-subscription-id
+        """
+        data = _construct_subscription(IppOperation.CREATE_PRINTER_SUBSCRIPTIONS, self.__user, printer,
+                                       events or IPP_DEFAULT_PRINTER_EVENTS, lease_duration)
+
+        response_data = self._request(self._construct_uri('', ''), data)
+
+        return response_data['subscriptions'][0]['notify-subscription-id']
+
+    def create_job_subscription(self, job_id: int, events=None):
+        data = _construct_subscription(IppOperation.CREATE_JOB_SUBSCRIPTIONS, self.__user,
+                                       events=events or IPP_DEFAULT_JOB_EVENTS, job_id=job_id)
+
+        response_data = self._request(self._construct_uri('', ''), data)
+
+        return response_data['subscriptions'][0]['notify-subscription-id']
+
+    def get_notifications(self, subscription_ids, sequence_numbers=None, wait=False):
+        """
+        returns the IppEvents of the subscriptions, sequence_numbers maps subscription ids to the first wanted event
+        """
+        cursor = _IppEventCursor(subscription_ids, sequence_numbers, wait=wait)
+
+        return cursor.process(self._request(self._construct_uri('', ''), cursor.construct_request(self.__user)))
+
+    def renew_subscription(self, subscription_id: int, lease_duration=IPP_SUBSCRIPTION_LEASE_DURATION):
+        data = construct_request(IppOperation.RENEW_SUBSCRIPTION, 1, {
+            'printer-uri': 'ipp://localhost/',
+            'notify-subscription-id': subscription_id,
+            'requesting-user-name': self.__user
+        }, subscription_attributes={
+            'notify-lease-duration': lease_duration
+        })
+
+        self._request(self._construct_uri('', ''), data)
+
+        return True
+
+    def cancel_subscription(self, subscription_id: int):
+        data = construct_request(IppOperation.CANCEL_SUBSCRIPTION, 1, {
+            'printer-uri': 'ipp://localhost/',
+            'notify-subscription-id': subscription_id,
+            'requesting-user-name': self.__user
+        })
+
+        self._request(self._construct_uri('', ''), data)
 
         return True
 
-    def print_test_page(self, printer):
+    def stream_events(self, subscription_ids, sequence_numbers=None, lease_duration=IPP_SUBSCRIPTION_LEASE_DURATION,
+                      wait=True, poll_interval=None):
+        """
+        returns an IppEventStream over the events of the subscriptions,
+        lease_duration=None disables the renewal of the subscriptions
+        """
+        return IppEventStream(self, subscription_ids, sequence_numbers, lease_duration, wait, poll_interval)
+
+    def print_test_page(self, printer, use_print_job=None):
+        if self._use_print_job(printer, use_print_job):
+            data = self._construct_print_job(printer, 'Test Print', 'application/postscript')
+
+            response_data = self._request(self._construct_uri('printers', printer), data + IPP_TEST_PAGE)
+
+            return response_data['jobs'][0]['job-id']
+
         printer_uri = 'ipp://localhost/printers/{0}'.format(printer)
 
         # construct request body part 1
@@ -852,58 +2917,53 @@ class IppClient:
             'job-name': 'Test Print'
         })
 
-        self._connection.request('POST', self._construct_uri('printers', printer),
-                                 headers=self._construct_headers(data, True), body=data)
-
-        response_data = parse_response(self._get_response_data())
+        response_data = self._request(self._construct_uri('printers', printer), data)
 
         job_id = response_data['jobs'][0]['job-id']
 
         # construct request body part 2
         # create document
-        data = construct_request(IppOperation.SEND_DOCUMENT, 2, operation_attributes={
-            'printer-uri': printer_uri,
-            'requesting-user-name': self.__user,
-            'job-id': job_id,
-            'document-name': 'Test Print',
-            'document-format': 'application/postscript',
-            'last-document': True
-        })
-
-        data += bytes('#PDF-BANNER\n' +
-                      'Template default-testpage.pdf\n' +
-                      'Show printer-name printer-info printer-location printer-make-and-model printer-driver-name' +
-                      'printer-driver-version paper-size imageable-area job-id options time-at-creation' +
-                      'time-at-processing\n\n', 'utf-8')
+        data = self._construct_send_document(printer, job_id, 'Test Print', 'application/postscript')
 
-        self._connection.request('POST', self._construct_uri('printers', printer),
-                                 headers=self._construct_headers(data), body=data)
-        parse_response(self._get_response_data())
+        self._request(self._construct_uri('printers', printer), data + IPP_TEST_PAGE)
 
         return job_id
 
+    def connect(self):
+        """
+        opens a connection ahead of the first request, e.g. to warm up a worker
+
+        clients connect on their first request otherwise, both raise IppTransportException if the server can't
+        be reached
+        """
+        # the connection stays open in the pool for the next request
+        with self._pool.connection() as connection:
+            self._connect(connection)
+
     def test_connection(self):
         try:
-            self._connection.connect()
-            self._connection.close()
+            self.connect()
 
             return True
-        except ConnectionRefusedError:
+        except IppTransportException:
             return False
 
 
 class CupsClient(IppClient):
-    def __init__(self, host, port=631, user=None, password=None, use_ssl=True, verify_certificate=True):
-        super().__init__(host, port, user, password, use_ssl, verify_certificate)
+    def __init__(self, host, port=631, user=None, password=None, use_ssl=True, verify_certificate=True, pool_size=1,
+                 connection_pool=None, attribute_cache=None, records=False, ssl_context=None,
+                 tls_session_cache=None):
+        super().__init__(host, port, user, password, use_ssl, verify_certificate, pool_size, connection_pool,
+                         attribute_cache, records, ssl_context, tls_session_cache)
 
     def get_devices(self):
-        data = construct_request(IppOperation.CUPS_GET_DEVICES, 1)
+        return {p['device-uri']: p for p in self.stream_devices()}
 
-        self._connection.request('POST', self._construct_uri('', ''),
-                                 headers=self._construct_headers(data), body=data)
-        response_data = parse_response(self._get_response_data())
+    def stream_devices(self):
+        # holds a pooled connection until the generator is exhausted, see stream_jobs
+        data = construct_request(IppOperation.CUPS_GET_DEVICES, 1)
 
-        return {p['device-uri']: p for p in response_data['printers']}
+        return self._stream_response(self._construct_uri('', ''), data, 'printers')
 
     def get_document(self, printer: str, job_id: int, document_id: int):
         data = construct_request(IppOperation.CUPS_GET_DOCUMENT, 1, operation_attributes={
@@ -912,9 +2972,7 @@ class CupsClient(IppClient):
             'document-number': document_id
         })
 
-        self._connection.request('POST', self._construct_uri('', ''),
-                                 headers=self._construct_headers(data), body=data)
-        response_data = parse_response(self._get_response_data(), True)
+        response_data = self._request(self._construct_uri('', ''), data, True)
 
         if response_data['data']:
             with NamedTemporaryFile(delete=False) as tmp_file:
@@ -929,39 +2987,35 @@ class CupsClient(IppClient):
     def move_job(self, job_id: int, destination_printer: str):
         data = construct_request(IppOperation.CUPS_MOVE_JOB, 1, {
             'job-uri': 'ipp://localhost/jobs/{0}'.format(job_id),
-            'requesting-user-name': self.__user
+            'requesting-user-name': self.user
         }, job_attributes={
             'job-printer-uri': 'ipp://localhost/printers/{0}'.format(destination_printer),
         })
 
-        self._connection.request('POST', self._construct_uri('jobs', ''),
-                                 headers=self._construct_headers(data), body=data)
-        parse_response(self._get_response_data())
+        self._request(self._construct_uri('jobs', ''), data)
 
         return True
 
     def move_all_jobs(self, source_printer: str, destination_printer: str):
         data = construct_request(IppOperation.CUPS_MOVE_JOB, 1, {
             'printer-uri': 'ipp://localhost/printers/{0}'.format(source_printer),
-            'requesting-user-name': self.__user
+            'requesting-user-name': self.user
         }, job_attributes={
             'job-printer-uri': 'ipp://localhost/printers/{0}'.format(destination_printer),
         })
 
-        self._connection.request('POST', self._construct_uri('jobs', ''),
-                                 headers=self._construct_headers(data), body=data)
-        parse_response(self._get_response_data())
+        self._request(self._construct_uri('jobs', ''), data)
 
         return True
 
     def get_ppds(self):
-        data = construct_request(IppOperation.CUPS_GET_PPDS, 1)
+        return {p['ppd-name']: p for p in self.stream_ppds()}
 
-        self._connection.request('POST', self._construct_uri('', ''),
-                                 headers=self._construct_headers(data), body=data)
-        response_data = parse_response(self._get_response_data())
+    def stream_ppds(self):
+        # holds a pooled connection until the generator is exhausted, see stream_jobs
+        data = construct_request(IppOperation.CUPS_GET_PPDS, 1)
 
-        return {p['ppd-name']: p for p in response_data['printers']}
+        return self._stream_response(self._construct_uri('', ''), data, 'printers')
 
     def accept_jobs(self, printer: str):
         printer_uri = 'ipp://localhost/printers/{0}'.format(printer)
@@ -970,9 +3024,9 @@ class CupsClient(IppClient):
             'printer-uri': printer_uri
         })
 
-        self._connection.request('POST', self._construct_uri('admin', ''),
-                                 headers=self._construct_headers(data), body=data)
-        parse_response(self._get_response_data())
+        self._request(self._construct_uri('admin', ''), data)
+
+        self._invalidate_printer(printer)
 
         return True
 
@@ -983,9 +3037,9 @@ class CupsClient(IppClient):
             'printer-uri': printer_uri
         })
 
-        self._connection.request('POST', self._construct_uri('admin', ''),
-                                 headers=self._construct_headers(data), body=data)
-        parse_response(self._get_response_data())
+        self._request(self._construct_uri('admin', ''), data)
+
+        self._invalidate_printer(printer)
 
         return True
 
@@ -1019,9 +3073,9 @@ class CupsClient(IppClient):
             'member-uris': members
         })
 
-        self._connection.request('POST', self._construct_uri('admin', ''),
-                                 headers=self._construct_headers(data), body=data)
-        parse_response(self._get_response_data())
+        self._request(self._construct_uri('admin', ''), data)
+
+        self._invalidate_printer(clazz)
 
         return True
 
@@ -1036,7 +3090,7 @@ class CupsClient(IppClient):
 
         if isinstance(members, list):
             # update class if members are more then one
-            members.remove('ipp://{0}:{1}/printers/{2}'.format(self.__host, self.__port, printer))
+            members.remove('ipp://{0}:{1}/printers/{2}'.format(self.host, self.port, printer))
 
             data = construct_request(IppOperation.CUPS_ADD_MODIFY_CLASS, 1, operation_attributes={
                 'printer-uri': class_uri
@@ -1049,9 +3103,9 @@ class CupsClient(IppClient):
                 'printer-uri': class_uri
             })
 
-        self._connection.request('POST', self._construct_uri('admin', ''),
-                                 headers=self._construct_headers(data), body=data)
-        parse_response(self._get_response_data())
+        self._request(self._construct_uri('admin', ''), data)
+
+        self._invalidate_printer(clazz)
 
         return True
 
@@ -1062,9 +3116,9 @@ class CupsClient(IppClient):
             'printer-uri': class_uri
         })
 
-        self._connection.request('POST', self._construct_uri('admin', ''),
-                                 headers=self._construct_headers(data), body=data)
-        parse_response(self._get_response_data())
+        self._request(self._construct_uri('admin', ''), data)
+
+        self._invalidate_printer(clazz)
 
         return True
 
@@ -1084,9 +3138,9 @@ class CupsClient(IppClient):
             'printer-location': location
         })
 
-        self._connection.request('POST', self._construct_uri('admin', ''),
-                                 headers=self._construct_headers(data), body=data)
-        parse_response(self._get_response_data())
+        self._request(self._construct_uri('admin', ''), data)
+
+        self._invalidate_printer(name)
 
         return True
 
@@ -1098,9 +3152,9 @@ class CupsClient(IppClient):
             'ppd-name': ppd_name
         })
 
-        self._connection.request('POST', self._construct_uri('admin', ''),
-                                 headers=self._construct_headers(data), body=data)
-        parse_response(self._get_response_data())
+        self._request(self._construct_uri('admin', ''), data)
+
+        self._invalidate_printer(printer)
 
         return True
 
@@ -1113,9 +3167,9 @@ class CupsClient(IppClient):
             'device-uri': device_uri
         })
 
-        self._connection.request('POST', self._construct_uri('admin', ''),
-                                 headers=self._construct_headers(data), body=data)
-        parse_response(self._get_response_data())
+        self._request(self._construct_uri('admin', ''), data)
+
+        self._invalidate_printer(printer)
 
         return True
 
@@ -1127,9 +3181,9 @@ class CupsClient(IppClient):
             'printer-is-shared': is_shared
         })
 
-        self._connection.request('POST', self._construct_uri('admin', ''),
-                                 headers=self._construct_headers(data), body=data)
-        parse_response(self._get_response_data())
+        self._request(self._construct_uri('admin', ''), data)
+
+        self._invalidate_printer(printer)
 
         return True
 
@@ -1142,9 +3196,9 @@ class CupsClient(IppClient):
             'printer-error-policy': error_policy
         })
 
-        self._connection.request('POST', self._construct_uri('admin', ''),
-                                 headers=self._construct_headers(data), body=data)
-        parse_response(self._get_response_data())
+        self._request(self._construct_uri('admin', ''), data)
+
+        self._invalidate_printer(printer)
 
         return True
 
@@ -1157,9 +3211,9 @@ class CupsClient(IppClient):
             'printer-info': information
         })
 
-        self._connection.request('POST', self._construct_uri('admin', ''),
-                                 headers=self._construct_headers(data), body=data)
-        parse_response(self._get_response_data())
+        self._request(self._construct_uri('admin', ''), data)
+
+        self._invalidate_printer(printer)
 
         return True
 
@@ -1172,9 +3226,9 @@ class CupsClient(IppClient):
             'printer-location': location
         })
 
-        self._connection.request('POST', self._construct_uri('admin', ''),
-                                 headers=self._construct_headers(data), body=data)
-        parse_response(self._get_response_data())
+        self._request(self._construct_uri('admin', ''), data)
+
+        self._invalidate_printer(printer)
 
         return True
 
@@ -1185,24 +3239,24 @@ class CupsClient(IppClient):
             'printer-uri': printer_uri
         })
 
-        self._connection.request('POST', self._construct_uri('admin', ''),
-                                 headers=self._construct_headers(data), body=data)
-        parse_response(self._get_response_data())
+        self._request(self._construct_uri('admin', ''), data)
+
+        self._invalidate_printer(printer)
 
         return True
 
     def get_printers(self, attributes=None):
+        return self._cached(None, 'printers', attributes,
+                            lambda: {p['printer-name']: p for p in self.stream_printers(attributes)})
+
+    def stream_printers(self, attributes=None):
+        # holds a pooled connection until the generator is exhausted, see stream_jobs
         data = construct_request(IppOperation.CUPS_GET_PRINTERS, 1, {
             'requesting-user-name': self.user,
             'requested-attributes': attributes + ['printer-name'] if attributes else IPP_DEFAULT_PRINTER_ATTRIBUTES
         })
 
-        self._connection.request('POST', self._construct_uri('', ''),
-                                 headers=self._construct_headers(data), body=data)
-
-        response_data = parse_response(self._get_response_data())
-
-        return {p['printer-name']: p for p in response_data['printers']}
+        return self._stream_response(self._construct_uri('', ''), data, 'printers')
 
     def get_classes(self, attributes=None):
         data = construct_request(IppOperation.CUPS_GET_CLASSES, 1, {
@@ -1210,14 +3264,400 @@ class CupsClient(IppClient):
             'requested-attributes': attributes + ['printer-name'] if attributes else IPP_DEFAULT_CLASS_ATTRIBUTES
         })
 
-        self._connection.request('POST', self._construct_uri('', ''),
-                                 headers=self._construct_headers(data), body=data)
-
-        response_data = parse_response(self._get_response_data())
+        response_data = self._request(self._construct_uri('', ''), data)
 
         return {p['printer-name']: p for p in response_data['printers']}
 
 
+class CupsCluster:
+    """
+    routes jobs to the least loaded printer of several cups servers
+
+    backends are CupsClients, a printer name is served by every backend with a printer of this name unless
+    equivalents maps it to (backend, printer) tuples, a backend is named 'host:port'. the queue depth and state of
+    all printers are refreshed every refresh_interval seconds with one get printers and one get jobs request per
+    backend. a backend which fails is skipped for retry_interval seconds
+    """
+
+    def __init__(self, backends, equivalents=None, refresh_interval=IPP_CLUSTER_REFRESH_INTERVAL,
+                 retry_interval=IPP_CLUSTER_RETRY_INTERVAL):
+        self._backends = collections.OrderedDict(('{0}:{1}'.format(b.host, b.port), b) for b in backends)
+        self._equivalents = equivalents or {}
+        self._refresh_interval = refresh_interval
+        self._retry_interval = retry_interval
+
+        # (backend, printer) -> [queued jobs, printer-state, printer-is-accepting-jobs]
+        self._queues = {}
+        self._refreshed_at = None
+        self._failed_until = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    @property
+    def backends(self):
+        return list(self._backends)
+
+    @property
+    def errors(self):
+        """
+        last exception of every failed backend
+        """
+        return dict(self._errors)
+
+    def _is_available(self, name: str):
+        return self._failed_until.get(name, 0) <= time.monotonic()
+
+    def _failed(self, name: str, error: Exception):
+        with self._lock:
+            self._failed_until[name] = time.monotonic() + self._retry_interval
+            self._errors[name] = error
+
+            for key in [k for k in self._queues if k[0] == name]:
+                del self._queues[key]
+
+    def _fan_out(self, function):
+        # calls function(backend) for all available backends at the same time, failed backends are left out
+        names = [name for name in self._backends if self._is_available(name)]
+        results = {}
+
+        if not names:
+            return results
+
+        with concurrent.futures.ThreadPoolExecutor(len(names)) as executor:
+            futures = {executor.submit(function, self._backends[name]): name for name in names}
+
+            for future in concurrent.futures.as_completed(futures):
+                name = futures[future]
+
+                try:
+                    results[name] = future.result()
+                except _IPP_REQUEST_ERRORS as e:
+                    self._failed(name, e)
+                else:
+                    with self._lock:
+                        self._errors.pop(name, None)
+
+        return results
+
+    @staticmethod
+    def _queue_states(backend):
+        printers = backend.get_printers(['printer-state', 'printer-is-accepting-jobs'])
+        queues = {name: [0, p.get('printer-state'), p.get('printer-is-accepting-jobs', True)]
+                  for name, p in printers.items()}
+
+        for job in backend.stream_jobs(which_jobs='not-completed', attributes=['job-printer-uri']):
+            queue = queues.get(job.get('job-printer-uri', '').rsplit('/', 1)[-1])
+
+            if queue is not None:
+                queue[0] += 1
+
+        return queues
+
+    def refresh(self):
+        """
+        requests the queue depth and state of all printers, this is the health check of the backends
+        """
+        states = self._fan_out(self._queue_states)
+
+        with self._lock:
+            self._queues = {(name, printer): queue for name, queues in states.items()
+                            for printer, queue in queues.items()}
+            self._refreshed_at = time.monotonic()
+
+    def _candidates(self, printer: str):
+        with self._lock:
+            stale = self._refreshed_at is None or time.monotonic() - self._refreshed_at > self._refresh_interval
+
+        if stale:
+            self.refresh()
+
+        targets = self._equivalents.get(printer) or [(name, printer) for name in self._backends]
+
+        with self._lock:
+            queues = [(self._queues[t], t) for t in targets if t in self._queues and self._is_available(t[0])]
+
+        # stopped printers and printers which reject jobs are only used if there is nothing else
+        usable = [(q, t) for q, t in queues if q[1] != IppPrinterState.STOPPED and q[2]]
+
+        return [t for _, t in sorted(usable or queues, key=lambda item: item[0][0])]
+
+    def _submit(self, printer: str, submit, rewind=None):
+        # rewind prepares the document to be sent again after an error, it returns False if it can't be sent again
+        last_error = None
+
+        for name, backend_printer in self._candidates(printer):
+            if last_error is not None and rewind is not None and not rewind():
+                raise last_error
+
+            try:
+                job_id = submit(self._backends[name], backend_printer)
+            except _IPP_REQUEST_ERRORS as e:
+                last_error = e
+
+                # ipp errors concern the printer, transport errors the whole server
+                if not isinstance(e, IppException):
+                    self._failed(name, e)
+
+                continue
+
+            with self._lock:
+                queue = self._queues.get((name, backend_printer))
+
+                # counts the job until the next refresh, so a burst of jobs is spread over the printers
+                if queue is not None:
+                    queue[0] += 1
+
+            return name, job_id
+
+        if last_error is not None:
+            raise last_error
+
+        raise IppException('No backend with printer {0} available'.format(printer), IppStatus.ERROR_NOT_FOUND)
+
+    def print_file(self, printer: str, file_path: str, **kwargs):
+        """
+        prints the file on the least loaded equivalent printer and fails over to the next one on errors,
+        returns a (backend, job id) tuple
+        """
+        return self._submit(printer, lambda backend, p: backend.print_file(p, file_path, **kwargs))
+
+    def print_stream(self, printer: str, document, **kwargs):
+        """
+        like print_file, but the document is only sent to the next printer after an error if it is a bytes-like
+        object or a seekable file, which is rewound to its position before the first attempt. the error is raised
+        for other documents, e.g. generators
+        """
+        if isinstance(document, (bytes, bytearray, memoryview)):
+            rewind = None
+        elif hasattr(document, 'seekable') and document.seekable():
+            position = document.tell()
+
+            def rewind():
+                document.seek(position)
+                return True
+        else:
+            def rewind():
+                return False
+
+        return self._submit(printer, lambda backend, p: backend.print_stream(p, document, **kwargs), rewind)
+
+    def get_printers(self, attributes=None):
+        """
+        returns the printers of all available backends by (backend, printer name)
+        """
+        printers = self._fan_out(lambda backend: backend.get_printers(attributes))
+
+        return {(name, printer): p for name, backend_printers in printers.items()
+                for printer, p in backend_printers.items()}
+
+    def get_jobs(self, printer=None, which_jobs='not-completed', my_jobs=False, attributes=None):
+        """
+        returns the jobs of all available backends by (backend, job id)
+        """
+        jobs = self._fan_out(lambda backend: backend.get_jobs(printer, which_jobs, my_jobs, attributes))
+
+        return {(name, job_id): job for name, backend_jobs in jobs.items() for job_id, job in backend_jobs.items()}
+
+    def queue_depths(self):
+        """
+        returns the number of queued jobs by (backend, printer) as known since the last refresh
+        """
+        with self._lock:
+            return {key: queue[0] for key, queue in self._queues.items()}
+
+
+class CupsCatalogCache:
+    """
+    persistent cache for the ppd and device catalogues of a cups server
+
+    the catalogues are stored as compact json files in directory and are downloaded again when they are older
+    than max_age seconds or refresh is called. the file names contain the server, so caches of several servers
+    can share the directory
+    """
+
+    _CATALOGUES = {
+        'ppds': ('ppd-name', 'ppd-make-and-model', 'ppd-device-id'),
+        'devices': ('device-uri', 'device-make-and-model', 'device-id')
+    }
+
+    def __init__(self, client: CupsClient, directory: str, max_age=24 * 60 * 60.0):
+        self._client = client
+        self._directory = directory
+        self._max_age = max_age
+        self._server = '{0}:{1}'.format(client.host, client.port)
+        # e.g. cups-print.example.com_631-ppds.json, the host can also be the path of a unix domain socket
+        self._file_prefix = 'cups-' + ''.join(c if c.isalnum() or c in '.-' else '_' for c in self._server)
+
+        self._catalogues = {}
+        self._lock = threading.Lock()
+
+    def _path(self, catalogue: str):
+        return os.path.join(self._directory, '{0}-{1}.json'.format(self._file_prefix, catalogue))
+
+    def _load(self, catalogue: str):
+        try:
+            with open(self._path(catalogue), 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if not isinstance(stored, dict) or stored.get('server') != self._server:
+            return None
+
+        # entries are stored as rows of the attribute names in keys, missing attributes are null
+        keys = stored['keys']
+        entries = [{k: v for k, v in zip(keys, row) if v is not None} for row in stored['rows']]
+
+        return self._index(catalogue, stored['created'], entries)
+
+    def _store(self, catalogue: str, created: float, entries: list):
+        keys = sorted({k for entry in entries for k in entry})
+        stored = {
+            'server': self._server,
+            'created': created,
+            'keys': keys,
+            'rows': [[entry.get(k) for k in keys] for entry in entries]
+        }
+
+        os.makedirs(self._directory, exist_ok=True)
+
+        with NamedTemporaryFile('w', encoding='utf-8', dir=self._directory, delete=False) as tmp_file:
+            tmp_file_name = tmp_file.name
+
+            json.dump(stored, tmp_file, separators=(',', ':'))
+
+        os.replace(tmp_file_name, self._path(catalogue))
+
+    def _index(self, catalogue: str, created: float, entries: list):
+        key, make_and_model, _ = self._CATALOGUES[catalogue]
+
+        # sorted lowercase make and model with the entry position for prefix searches
+        models = sorted((_attribute_text(entry.get(make_and_model)).lower(), i) for i, entry in enumerate(entries))
+
+        return {
+            'created': created,
+            'entries': {entry[key]: entry for entry in entries if key in entry},
+            'list': entries,
+            'models': models,
+            'model-keys': [m for m, _ in models]
+        }
+
+    def _download(self, catalogue: str):
+        stream = self._client.stream_ppds() if catalogue == 'ppds' else self._client.stream_devices()
+
+        return list(stream)
+
+    def _get(self, catalogue: str, refresh=False):
+        with self._lock:
+            cached = self._catalogues.get(catalogue)
+
+            if cached is None and not refresh:
+                cached = self._catalogues[catalogue] = self._load(catalogue)
+
+            if refresh or cached is None or time.time() - cached['created'] > self._max_age:
+                created = time.time()
+                entries = self._download(catalogue)
+
+                self._store(catalogue, created, entries)
+                cached = self._catalogues[catalogue] = self._index(catalogue, created, entries)
+
+            return cached
+
+    def _find(self, catalogue: str, make_and_model=None, device_id=None):
+        cached = self._get(catalogue)
+        entries = cached['list']
+
+        if make_and_model is not None:
+            prefix = make_and_model.lower()
+            models = cached['model-keys']
+            start = bisect.bisect_left(models, prefix)
+            end = bisect.bisect_left(models, prefix + '\uffff', start)
+
+            entries = [entries[i] for _, i in sorted(cached['models'][start:end], key=lambda m: m[1])]
+
+        if device_id is not None:
+            wanted = _parse_device_id(device_id)
+            _, _, device_id_key = self._CATALOGUES[catalogue]
+
+            entries = [e for e in entries if _match_device_id(wanted, _parse_device_id(e.get(device_id_key)))]
+
+        return copy.deepcopy(entries)
+
+    def age(self, catalogue='ppds'):
+        """
+        returns the age of the cached catalogue in seconds or None if it was never downloaded
+        """
+        with self._lock:
+            cached = self._catalogues.get(catalogue)
+
+            if cached is None:
+                cached = self._catalogues[catalogue] = self._load(catalogue)
+
+        return None if cached is None else max(0.0, time.time() - cached['created'])
+
+    def is_stale(self, catalogue='ppds'):
+        age = self.age(catalogue)
+
+        return age is None or age > self._max_age
+
+    def refresh(self, catalogue=None):
+        for name in [catalogue] if catalogue else self._CATALOGUES:
+            self._get(name, refresh=True)
+
+    def invalidate(self):
+        with self._lock:
+            self._catalogues.clear()
+
+            for name in self._CATALOGUES:
+                try:
+                    os.remove(self._path(name))
+                except FileNotFoundError:
+                    pass
+
+    def get_ppds(self):
+        return copy.deepcopy(self._get('ppds')['entries'])
+
+    def get_devices(self):
+        return copy.deepcopy(self._get('devices')['entries'])
+
+    def find_ppds(self, make_and_model=None, device_id=None):
+        """
+        make_and_model is a case insensitive prefix of ppd-make-and-model, device_id an ieee 1284 device id whose
+        given keys have to match, e.g. 'MFG:HP;MDL:LaserJet 4000;'
+        """
+        return self._find('ppds', make_and_model, device_id)
+
+    def find_devices(self, make_and_model=None, device_id=None):
+        return self._find('devices', make_and_model, device_id)
+
+
+def _attribute_text(value):
+    if isinstance(value, list):
+        value = value[0] if value else None
+
+    return value if isinstance(value, str) else ''
+
+
+_IPP_DEVICE_ID_KEYS = {'MANUFACTURER': 'MFG', 'MODEL': 'MDL', 'COMMAND SET': 'CMD', 'DESCRIPTION': 'DES'}
+
+
+def _parse_device_id(device_id):
+    parsed = {}
+
+    for field in _attribute_text(device_id).split(';'):
+        key, separator, value = field.partition(':')
+
+        if separator:
+            key = key.strip().upper()
+            parsed[_IPP_DEVICE_ID_KEYS.get(key, key)] = value.strip().lower()
+
+    return parsed
+
+
+def _match_device_id(wanted: dict, device_id: dict):
+    return all(device_id.get(k) == v for k, v in wanted.items())
+
+
 def parse_control_file(job_id: int, spool_dir='/var/spool/cups'):
     control_file = os.path.join(spool_dir, 'c{0}'.format(job_id))
 
@@ -1228,3 +3668,344 @@ def parse_control_file(job_id: int, spool_dir='/var/spool/cups'):
         data = parse_response_without_check(f.read())
 
     return data
+
+
+# errors of a control file which was removed or is partially written by cups meanwhile
+_IPP_CONTROL_FILE_ERRORS = (OSError, IndexError, ValueError, struct.error, IppException)
+
+
+def _numpy():
+    # numpy is an optional accelerator of IppJobTable
+    try:
+        import numpy
+    except ImportError:
+        return None
+
+    return numpy
+
+
+class IppJobTable:
+    """
+    column store of jobs for accounting
+
+    the IPP_JOB_TABLE_COLUMNS are stored as array('q') columns, the user and printer names are dictionary encoded as
+    array('i') codes into the users and printers lists. the aggregations use numpy if it is installed
+    """
+
+    _DICTIONARY_COLUMNS = {
+        'user': 'users',
+        'printer': 'printers'
+    }
+
+    def __init__(self):
+        self.columns = {name: array.array('q') for name in IPP_JOB_TABLE_COLUMNS}
+        self.user_codes = array.array('i')
+        self.printer_codes = array.array('i')
+        self.users = []
+        self.printers = []
+
+        self._user_index = {}
+        self._printer_index = {}
+
+    def __len__(self):
+        return len(self.user_codes)
+
+    @staticmethod
+    def _encode(value, values: list, index: dict):
+        code = index.get(value)
+
+        if code is None:
+            code = index[value] = len(values)
+            values.append(value)
+
+        return code
+
+    def append(self, job):
+        for name, column in self.columns.items():
+            value = job.get(name)
+            column.append(value if isinstance(value, int) else 0)
+
+        printer = job.get('job-printer-uri') or job.get('printer-uri') or ''
+        if isinstance(printer, list):
+            printer = printer[0]
+
+        self.user_codes.append(self._encode(job.get('job-originating-user-name', ''), self.users, self._user_index))
+        self.printer_codes.append(self._encode(printer.rsplit('/', 1)[-1], self.printers, self._printer_index))
+
+    @classmethod
+    def from_jobs(cls, jobs):
+        """
+        creates the table from an iterable of jobs, e.g. IppClient.iter_jobs(), without keeping the jobs
+        """
+        table = cls()
+
+        for job in jobs:
+            table.append(job)
+
+        return table
+
+    @classmethod
+    def from_control_files(cls, spool_dir='/var/spool/cups'):
+        table = cls()
+
+        for file_name in sorted(os.listdir(spool_dir)):
+            if file_name[:1] != 'c' or not file_name[1:].isdigit():
+                continue
+
+            try:
+                with open(os.path.join(spool_dir, file_name), 'rb') as f:
+                    data = parse_response_without_check(f.read())
+            except _IPP_CONTROL_FILE_ERRORS:
+                continue
+
+            for job in data['jobs']:
+                if 'job-id' not in job:
+                    job['job-id'] = int(file_name[1:])
+
+                table.append(job)
+
+        return table
+
+    def _codes(self, by: str):
+        if by not in self._DICTIONARY_COLUMNS:
+            raise ValueError('Unknown group column {0}'.format(by))
+
+        return self.user_codes if by == 'user' else self.printer_codes, getattr(self, self._DICTIONARY_COLUMNS[by])
+
+    def to_numpy(self):
+        """
+        returns the columns as numpy arrays without copying them, the table can't grow while they exist
+        """
+        numpy = _numpy()
+        if numpy is None:
+            raise ImportError('IppJobTable.to_numpy needs numpy')
+
+        arrays = {name: numpy.frombuffer(column, dtype=numpy.int64) for name, column in self.columns.items()}
+        arrays['user'] = numpy.frombuffer(self.user_codes, dtype=numpy.int32)
+        arrays['printer'] = numpy.frombuffer(self.printer_codes, dtype=numpy.int32)
+
+        return arrays
+
+    def totals(self, by='user', column='job-k-octets'):
+        """
+        returns the sum of the column per user or printer
+        """
+        codes, values = self._codes(by)
+        numpy = _numpy()
+
+        if numpy is not None and len(codes):
+            sums = numpy.bincount(numpy.frombuffer(codes, dtype=numpy.int32),
+                                  weights=numpy.frombuffer(self.columns[column], dtype=numpy.int64),
+                                  minlength=len(values))
+
+            return {value: int(total) for value, total in zip(values, sums)}
+
+        sums = [0] * len(values)
+        for code, value in zip(codes, self.columns[column]):
+            sums[code] += value
+
+        return dict(zip(values, sums))
+
+    def counts(self, by='user'):
+        codes, values = self._codes(by)
+        numpy = _numpy()
+
+        if numpy is not None and len(codes):
+            counts = numpy.bincount(numpy.frombuffer(codes, dtype=numpy.int32), minlength=len(values))
+
+            return {value: int(count) for value, count in zip(values, counts)}
+
+        counts = [0] * len(values)
+        for code in codes:
+            counts[code] += 1
+
+        return dict(zip(values, counts))
+
+    def state_histogram(self):
+        """
+        returns the number of jobs per IppJobState
+        """
+        states = self.columns['job-state']
+        numpy = _numpy()
+
+        if numpy is not None and len(states):
+            counts = numpy.bincount(numpy.frombuffer(states, dtype=numpy.int64))
+            histogram = {state: int(count) for state, count in enumerate(counts) if count}
+        else:
+            histogram = collections.Counter(states)
+
+        return {IppJobState(state) if state in IppJobState._value2member_map_ else state: count
+                for state, count in histogram.items()}
+
+
+def _parse_control_file_summary(path: str):
+    # runs in the worker processes of CupsSpoolIndex, returns the indexed attributes of the job or None
+    try:
+        with open(path, 'rb') as f:
+            data = parse_response_without_check(f.read())
+    except _IPP_CONTROL_FILE_ERRORS:
+        return None
+
+    if not data['jobs']:
+        return None
+
+    job = data['jobs'][0]
+    values = [job.get(name) for name in IPP_SPOOL_INDEX_ATTRIBUTES]
+
+    if isinstance(values[-1], list):
+        values[-1] = values[-1][0]
+
+    # the printer is stored by its name and enums as plain integers for the json index
+    values[-1] = values[-1].rsplit('/', 1)[-1] if isinstance(values[-1], str) else None
+
+    return [int(v) if isinstance(v, IntEnum) else v for v in values]
+
+
+class CupsSpoolIndex:
+    """
+    index of the job control files in the cups spool directory
+
+    refresh() only parses the control files which are new or whose mtime or size changed, many changed files are
+    parsed by a process pool with workers processes. the index is kept in index_path, so later runs start with it.
+    scripts which refresh with a process pool have to guard their entry point with if __name__ == '__main__'
+    """
+
+    _KEYS = IPP_SPOOL_INDEX_ATTRIBUTES[:-1] + ['printer']
+
+    def __init__(self, spool_dir='/var/spool/cups', index_path=None, workers=None):
+        self._spool_dir = spool_dir
+        self._index_path = index_path
+        self._workers = workers
+
+        # control file name -> [mtime_ns, size, attribute values]
+        self._files = {}
+        self._lock = threading.Lock()
+
+        if index_path:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if isinstance(stored, dict) and stored.get('spool-dir') == self._spool_dir and stored.get('keys') == self._KEYS:
+            self._files = stored['files']
+
+    def _store(self):
+        directory = os.path.dirname(os.path.abspath(self._index_path))
+
+        with NamedTemporaryFile('w', encoding='utf-8', dir=directory, delete=False) as tmp_file:
+            tmp_file_name = tmp_file.name
+
+            json.dump({'spool-dir': self._spool_dir, 'keys': self._KEYS, 'files': self._files}, tmp_file,
+                      separators=(',', ':'))
+
+        os.replace(tmp_file_name, self._index_path)
+
+    def _parse(self, paths: list):
+        workers = self._workers if self._workers is not None else os.cpu_count() or 1
+
+        if len(paths) < IPP_SPOOL_PARALLEL_THRESHOLD or workers < 2:
+            return [_parse_control_file_summary(path) for path in paths]
+
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            return list(executor.map(_parse_control_file_summary, paths, chunksize=64))
+
+    def refresh(self):
+        """
+        updates the index from the spool directory and returns the number of parsed control files
+        """
+        with self._lock:
+            current = {}
+            changed = []
+
+            with os.scandir(self._spool_dir) as entries:
+                for entry in entries:
+                    if entry.name[:1] != 'c' or not entry.name[1:].isdigit():
+                        continue
+
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+
+                    known = self._files.get(entry.name)
+
+                    if known is not None and known[0] == stat.st_mtime_ns and known[1] == stat.st_size:
+                        current[entry.name] = known
+                    else:
+                        current[entry.name] = [stat.st_mtime_ns, stat.st_size, None]
+                        changed.append(entry.name)
+
+            summaries = self._parse([os.path.join(self._spool_dir, name) for name in changed])
+
+            # unreadable files stay in the index without values, they are parsed again when they change
+            for name, summary in zip(changed, summaries):
+                if summary is not None and summary[0] is None:
+                    summary[0] = int(name[1:])
+
+                current[name][2] = summary
+
+            self._files = current
+
+            if self._index_path:
+                self._store()
+
+            return len(changed)
+
+    def __len__(self):
+        return sum(1 for _, _, values in self._files.values() if values is not None)
+
+    def jobs(self):
+        """
+        yields the indexed jobs as dicts with the keys of IPP_SPOOL_INDEX_ATTRIBUTES, the printer is given by name
+        """
+        for _, _, values in list(self._files.values()):
+            if values is not None:
+                yield dict(zip(self._KEYS, values))
+
+    def find(self, user=None, printer=None, state=None, since=None, until=None):
+        """
+        returns the indexed jobs which match all given filters, state is an IppJobState or a list of them,
+        since and until limit the time-at-creation of the jobs
+        """
+        states = {int(s) for s in state} if isinstance(state, (list, tuple, set, frozenset)) else \
+            {int(state)} if state is not None else None
+
+        keys = self._KEYS
+        state_index, created_index = keys.index('job-state'), keys.index('time-at-creation')
+        user_index, printer_index = keys.index('job-originating-user-name'), keys.index('printer')
+
+        found = []
+        for _, _, values in list(self._files.values()):
+            if values is None:
+                continue
+            if user is not None and values[user_index] != user:
+                continue
+            if printer is not None and values[printer_index] != printer:
+                continue
+            if states is not None and values[state_index] not in states:
+                continue
+            if since is not None and (values[created_index] or 0) < since:
+                continue
+            if until is not None and (values[created_index] or 0) >= until:
+                continue
+
+            found.append(dict(zip(keys, values)))
+
+        return sorted(found, key=lambda j: j['job-id'])
+
+    def to_table(self):
+        """
+        returns the indexed jobs as IppJobTable
+        """
+        table = IppJobTable()
+
+        for job in self.jobs():
+            job['job-printer-uri'] = job['printer']
+            table.append(job)
+
+        return table